@@ -0,0 +1,93 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pedalboard_engine import DEFAULT_BLOCK_SIZE, load_preset, process_file
+
+#headless batch renderer - runs every audio file in a directory through a preset on a pool of worker processes
+#example: python pedalboard_batch.py my_preset.json clips/ rendered/ --workers 8
+
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.mp3', '.ogg', '.aiff', '.aif', '.m4a')
+
+def find_audio_files(input_dir, recursive = False):
+    if recursive:
+        paths = [os.path.join(root, name) for root, _, names in os.walk(input_dir) for name in names]
+    else:
+        paths = [os.path.join(input_dir, name) for name in os.listdir(input_dir)]
+
+    return sorted(p for p in paths if os.path.isfile(p) and p.lower().endswith(AUDIO_EXTENSIONS))
+
+def render_one(in_path, out_path, preset, block_size, bit_depth, quality):
+    #runs in a worker process
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok = True)
+    start = time.perf_counter()
+    duration_sec = process_file(in_path, out_path, preset, block_size, bit_depth, quality)
+    return duration_sec, time.perf_counter() - start
+
+def run_batch(preset, input_dir, output_dir, workers = None, block_size = DEFAULT_BLOCK_SIZE, recursive = False,
+    output_extension = '.wav', bit_depth = 16, quality = None):
+    preset = load_preset(preset)
+    if not output_extension.startswith('.'):
+        output_extension = '.' + output_extension
+    in_paths = find_audio_files(input_dir, recursive)
+    if not in_paths:
+        print(f'No audio files found in {input_dir}')
+        return 0, 0.0, 0.0
+
+    jobs = {}
+    total_audio_sec = 0.0
+    failures = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers = workers) as pool:
+        for in_path in in_paths:
+            rel_path = os.path.splitext(os.path.relpath(in_path, input_dir))[0] + output_extension
+            out_path = os.path.join(output_dir, rel_path)
+            if os.path.realpath(out_path) == os.path.realpath(in_path) or (os.path.exists(out_path)
+                    and os.path.samefile(out_path, in_path)):
+                #writing would truncate the input while it is still being read
+                failures += 1
+                print(f'SKIPPED {in_path}: output path is the input file - use a different output directory or extension')
+                continue
+            jobs[pool.submit(render_one, in_path, out_path, preset, block_size, bit_depth, quality)] = in_path
+
+        for i, future in enumerate(as_completed(jobs), 1):
+            in_path = jobs[future]
+            try:
+                duration_sec, render_sec = future.result()
+            except Exception as e:
+                failures += 1
+                print(f'[{i}/{len(jobs)}] FAILED {in_path}: {e}')
+                continue
+
+            total_audio_sec += duration_sec
+            print(f'[{i}/{len(jobs)}] {in_path} - {duration_sec:.1f}s audio in {render_sec:.2f}s '
+                f'({duration_sec / max(render_sec, 1e-9):.1f}x realtime)')
+
+    wall_sec = time.perf_counter() - start
+    print(f'Processed {len(in_paths) - failures}/{len(in_paths)} files, {total_audio_sec:.1f}s of audio in {wall_sec:.2f}s '
+        f'- {total_audio_sec / max(wall_sec, 1e-9):.1f}x realtime')
+
+    return failures, total_audio_sec, wall_sec
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Run a directory of audio files through a Pedalboard preset')
+    parser.add_argument('preset', help = 'JSON preset file - same parameter names as pedalboard_engine.DEFAULT_PRESET')
+    parser.add_argument('input_dir', help = 'Directory of audio files to process')
+    parser.add_argument('output_dir', help = 'Directory to write processed files to')
+    parser.add_argument('--workers', type = int, default = None, help = 'Number of worker processes (default: CPU count)')
+    parser.add_argument('--block-size', type = int, default = DEFAULT_BLOCK_SIZE, help = 'Samples per streamed block')
+    parser.add_argument('--recursive', action = 'store_true', help = 'Also process files in subdirectories')
+    parser.add_argument('--output-extension', default = '.wav', help = 'Output file type, e.g. .wav, .flac, .ogg or .mp3')
+    parser.add_argument('--bit-depth', type = int, default = 16, choices = [16, 24, 32],
+        help = 'Output bit depth for .wav / .flac, 32 = float (24-bit for .flac)')
+    parser.add_argument('--quality', default = None,
+        help = 'FLAC compression level 0-8, OGG bitrate e.g. "192 kbps", MP3 VBR level V0-V9 or bitrate e.g. "320 kbps"')
+    args = parser.parse_args(argv)
+
+    failures, _, _ = run_batch(args.preset, args.input_dir, args.output_dir, args.workers, args.block_size,
+        args.recursive, args.output_extension, args.bit_depth, args.quality)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,160 @@
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+import numpy as np
+import pedalboard
+from pedalboard_engine import load_preset, render_audio
+
+#per-effect throughput benchmarks - every effect (and a few representative full chains) on synthetic mono / stereo
+#signals at several lengths and sample rates. Reports realtime factor, wall time and peak memory, and can save results
+#as JSON and compare them against a stored baseline to flag regressions
+#example: python pedalboard_bench.py --save bench.json
+#         python pedalboard_bench.py --baseline bench.json
+
+EFFECTS = {
+    'noise_gate': {'noise_gate_enabled': True, 'noise_gate_threshold_db': -40},
+    'gain': {'gain': 6},
+    'reverb': {'reverb_enabled': True},
+    'delay': {'delay_enabled': True, 'delay_feedback': 0.4},
+    'chorus': {'chorus_enabled': True},
+    'phaser': {'phaser_enabled': True},
+    'pitchshift': {'pitchshift_enabled': True, 'pitchshift_semitones': 3},
+    'compressor': {'compressor_enabled': True, 'compressor_threshold_db': -20, 'compressor_ratio': 4},
+    'distortion': {'distortion_enabled': True},
+    'bitcrush': {'bitcrush_enabled': True},
+    'gsm_full_rate_compressor': {'gsm_full_rate_compressor': 'WindowedSinc8'},
+    'mp3_compressor': {'mp3_compressor_enabled': True},
+    'resample': {'resample_method': 'WindowedSinc32'},
+    'highpass_filter': {'highpass_filter_enabled': True, 'highpass_filter_cutoff_frequency': 100},
+    'lowpass_filter': {'lowpass_filter_enabled': True, 'lowpass_filter_cutoff_frequency': 4000},
+    'high_shelf_filter': {'high_shelf_filter_enabled': True, 'high_shelf_filter_gain_db': 6},
+    'low_shelf_filter': {'low_shelf_filter_enabled': True, 'low_shelf_filter_gain_db': 6},
+    'peak_filter': {'peak_filter_enabled': True, 'peak_filter_gain_db': 6},
+    'ladder_filter': {'ladder_filter_enabled': True, 'ladder_filter_cutoff_hz': 1000},
+    'limiter': {'limiter_enabled': True},
+    'clipping': {'clipping_enabled': True},
+    'time_stretch': {'time_strech_factor': 1.25},
+}
+
+CHAINS = {
+    'chain_vocal': {**EFFECTS['noise_gate'], **EFFECTS['highpass_filter'], **EFFECTS['compressor'],
+        **EFFECTS['high_shelf_filter'], **EFFECTS['reverb'], **EFFECTS['limiter']},
+    'chain_lofi': {**EFFECTS['distortion'], **EFFECTS['bitcrush'], **EFFECTS['resample'],
+        **EFFECTS['mp3_compressor'], **EFFECTS['lowpass_filter']},
+    'chain_ambient': {**EFFECTS['pitchshift'], **EFFECTS['chorus'], **EFFECTS['delay'], **EFFECTS['reverb'],
+        **EFFECTS['limiter']},
+}
+
+DEFAULT_LENGTHS_SEC = [1, 10, 30]
+DEFAULT_SAMPLE_RATES = [44100, 48000]
+DEFAULT_CHANNELS = [1, 2]
+DEFAULT_TOLERANCE = 0.2 #flag a regression when realtime factor drops by more than 20%
+
+def make_signal(num_channels, sample_rate, length_sec, seed = 0):
+    #noise plus a few sines - broadband enough to exercise every effect, and repeatable between runs
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(sample_rate * length_sec), dtype = np.float32) / sample_rate
+    tone = sum(np.sin(2 * np.pi * f * t) for f in (110, 440, 1760)).astype(np.float32) / 6
+    return np.stack([tone + 0.05 * rng.standard_normal(t.shape[0], dtype = np.float32) for _ in range(num_channels)])
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024 #kilobytes on Linux, bytes on macOS
+
+def run_case(effect, num_channels, sample_rate, length_sec, repeats):
+    #runs in a fresh process, so peak memory is not polluted by earlier cases
+    preset = load_preset({**EFFECTS, **CHAINS}[effect])
+    audio_data = make_signal(num_channels, sample_rate, length_sec)
+    render_audio(audio_data[:, :sample_rate // 10], sample_rate, preset) #warm up - plugin construction, lazy init
+    rss_before = peak_rss_bytes()
+
+    wall_sec = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        render_audio(audio_data, sample_rate, preset)
+        wall_sec.append(time.perf_counter() - start)
+
+    best = min(wall_sec)
+    return {
+        'effect': effect, 'channels': num_channels, 'sample_rate': sample_rate, 'length_sec': length_sec,
+        'wall_sec': best,
+        'mean_wall_sec': sum(wall_sec) / len(wall_sec),
+        'realtime_factor': length_sec / best,
+        'peak_memory_mb': max(peak_rss_bytes() - rss_before, 0) / 2 ** 20, #extra peak RSS while rendering
+    }
+
+def case_id(result):
+    return f"{result['effect']}/{result['channels']}ch/{result['sample_rate']}hz/{result['length_sec']:g}s"
+
+def run_benchmarks(effects, lengths_sec, sample_rates, channels, repeats = 3):
+    cases = [(e, c, sr, n) for e in effects for sr in sample_rates for c in channels for n in lengths_sec]
+    results = {}
+
+    with multiprocessing.get_context('spawn').Pool(1, maxtasksperchild = 1) as pool:
+        for i, case in enumerate(cases, 1):
+            result = pool.apply(run_case, case + (repeats,))
+            results[case_id(result)] = result
+            print(f"[{i}/{len(cases)}] {case_id(result):<45} {result['realtime_factor']:>9.1f}x realtime "
+                f"{1000 * result['wall_sec']:>9.1f} ms {result['peak_memory_mb']:>8.1f} MB")
+
+    return {
+        'meta': {
+            'pedalboard_version': pedalboard.__version__,
+            'numpy_version': np.__version__,
+            'python_version': platform.python_version(),
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'repeats': repeats,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+def compare(results, baseline, tolerance = DEFAULT_TOLERANCE):
+    #returns a list of (case_id, baseline realtime factor, new realtime factor) that got slower than tolerance allows
+    regressions = []
+    for key, result in results['results'].items():
+        base = baseline['results'].get(key)
+        if base and result['realtime_factor'] < base['realtime_factor'] * (1 - tolerance):
+            regressions.append((key, base['realtime_factor'], result['realtime_factor']))
+    return regressions
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Benchmark the throughput of each effect in the Pedalboard GUI chain')
+    parser.add_argument('--effects', nargs = '+', default = list(EFFECTS) + list(CHAINS),
+        choices = list(EFFECTS) + list(CHAINS))
+    parser.add_argument('--lengths', nargs = '+', type = float, default = DEFAULT_LENGTHS_SEC, help = 'Signal lengths in seconds')
+    parser.add_argument('--sample-rates', nargs = '+', type = int, default = DEFAULT_SAMPLE_RATES)
+    parser.add_argument('--channels', nargs = '+', type = int, default = DEFAULT_CHANNELS)
+    parser.add_argument('--repeats', type = int, default = 3, help = 'Runs per case - the fastest is reported')
+    parser.add_argument('--save', help = 'Write results to this JSON file')
+    parser.add_argument('--baseline', help = 'Compare against results saved earlier with --save')
+    parser.add_argument('--tolerance', type = float, default = DEFAULT_TOLERANCE,
+        help = 'Allowed drop in realtime factor before a case is flagged, e.g. 0.2 = 20%%')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.effects, args.lengths, args.sample_rates, args.channels, args.repeats)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent = 2)
+        print(f'Saved results to {args.save}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        regressions = compare(results, baseline, args.tolerance)
+        for key, base_rtf, new_rtf in regressions:
+            print(f'REGRESSION {key}: {base_rtf:.1f}x -> {new_rtf:.1f}x realtime ({100 * (1 - new_rtf / base_rtf):.0f}% slower)')
+        print(f'{len(regressions)} regressions against {args.baseline}')
+        return 1 if regressions else 0
+
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
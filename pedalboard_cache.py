@@ -0,0 +1,168 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+import pedalboard
+
+#in-memory cache of intermediate buffers, so re-submitting after tweaking a late stage in the chain
+#only re-runs the stages after the last unchanged one. RenderCache keeps finished renders on disk, so rendering
+#the same input with the same preset again is just a file copy
+
+RENDER_CACHE_VERSION = 1 #bump when a change to the rendering code changes its output, so old renders aren't served
+
+def hash_audio(audio_data, sample_rate, *extra):
+    h = hashlib.blake2b(digest_size = 16)
+    h.update(repr((audio_data.shape, str(audio_data.dtype), sample_rate, extra)).encode())
+    h.update(memoryview(audio_data).cast('B') if audio_data.flags.c_contiguous else audio_data.tobytes())
+    return h.hexdigest()
+
+def hash_file(path, chunk_size = 1 << 20):
+    #hash of the encoded input file - no decoding needed to check the render cache
+    h = hashlib.blake2b(digest_size = 16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def render_key(input_hash, preset_json, *options):
+    #key of a finished render = input audio + full serialized preset (pedalboard_engine.dump_preset) + output options,
+    #plus the versions of the code that rendered it - upgrading pedalboard or the render code misses the old entries
+    versions = (RENDER_CACHE_VERSION, pedalboard.__version__)
+    return hashlib.blake2b(repr((versions, input_hash, preset_json, options)).encode(), digest_size = 16).hexdigest()
+
+def chain_key(prev_key, stage_key):
+    #key of a stage output = hash of the key of its input + the stage's own parameters
+    return hashlib.blake2b((prev_key + repr(stage_key)).encode(), digest_size = 16).hexdigest()
+
+class StageCache:
+    #LRU cache of numpy arrays, capped by total size in bytes
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if value.nbytes > self.max_bytes:
+            return
+
+        value.flags.writeable = False #cached buffers are shared between requests
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return
+
+            self._items[key] = value
+            self.num_bytes += value.nbytes
+            while self.num_bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last = False)
+                self.num_bytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.num_bytes = 0
+
+    def __len__(self):
+        return len(self._items)
+
+class RenderCache:
+    #content addressed on-disk cache of rendered files, capped by total size in bytes. Least recently used files are
+    #deleted first - file mtime records last use, so the LRU order survives restarts
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict() #key -> (path, size), least recently used first
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok = True)
+        entries = []
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            if name.startswith('.') or not os.path.isfile(path):
+                continue
+            st = os.stat(path)
+            entries.append((st.st_mtime, os.path.splitext(name)[0], path, st.st_size))
+        for _, key, path, size in sorted(entries):
+            self._items[key] = (path, size)
+            self.num_bytes += size
+
+    def get(self, key, make_out_path, count = True):
+        #copy the cached render for key to the path returned by make_out_path(), which is only called on a hit so misses
+        #don't leave empty temp files behind. Returns that path, or None on a miss. The copy is what gets served,
+        #so evicting the cached file later can't break a download in progress. count = False for lookups of files
+        #that belong to another entry, so they don't skew the hit rate
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += count
+                return None
+            self._items.move_to_end(key)
+            self.hits += count
+
+        out_path = None
+        try:
+            os.utime(item[0])
+            out_path = make_out_path()
+            shutil.copyfile(item[0], out_path)
+        except FileNotFoundError: #deleted from outside
+            if out_path is not None and os.path.exists(out_path):
+                os.remove(out_path)
+            with self._lock:
+                if self._items.pop(key, None):
+                    self.num_bytes -= item[1]
+                self.hits -= count
+                self.misses += count
+            return None
+        return out_path
+
+    def put(self, key, path):
+        #store a copy of the rendered file at path
+        size = os.path.getsize(path)
+        if size > self.max_bytes:
+            return
+
+        cached_path = os.path.join(self.cache_dir, key + os.path.splitext(path)[1])
+        fd, tmp_path = tempfile.mkstemp(dir = self.cache_dir, prefix = '.')
+        os.close(fd)
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, cached_path) #atomic - readers never see a partly written file
+
+        evicted = []
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old:
+                self.num_bytes -= old[1]
+            self._items[key] = (cached_path, size)
+            self.num_bytes += size
+            while self.num_bytes > self.max_bytes:
+                _, (evicted_path, evicted_size) = self._items.popitem(last = False)
+                self.num_bytes -= evicted_size
+                evicted.append(evicted_path)
+
+        for evicted_path in evicted:
+            try:
+                os.remove(evicted_path)
+            except FileNotFoundError:
+                pass
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self):
+        return len(self._items)
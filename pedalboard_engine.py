@@ -0,0 +1,688 @@
+import json
+import math
+import os
+import threading
+import time
+import weakref
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from pedalboard import (Pedalboard, Chorus, Reverb, Gain, Phaser, Compressor, HighpassFilter, LowpassFilter,
+    Distortion, Delay, Bitcrush, MP3Compressor, PitchShift, Limiter, Clipping, time_stretch,
+    GSMFullRateCompressor, Resample, LadderFilter, LowShelfFilter, HighShelfFilter, PeakFilter, NoiseGate)
+from pedalboard.io import AudioFile
+from pedalboard_cache import chain_key, hash_audio
+
+#UI-free processing engine - used by the GUI, and importable for offline / batch jobs without starting a web server
+
+#every effect parameter, in the order the GUI passes them in. Defaults match the GUI slider defaults
+DEFAULT_PRESET = {
+    'gain': 0,
+    'noise_gate_enabled': False, 'noise_gate_threshold_db': -100, 'noise_gate_ratio': 10,
+    'noise_gate_attack_ms': 1, 'noise_gate_release_ms': 100,
+    'reverb_enabled': False, 'reverb_room_size': 0.5, 'reverb_damping': 0.5, 'reverb_wet_level': 0.33,
+    'reverb_dry_level': 0.4, 'reverb_width': 1, 'reverb_freeze_mode': 0,
+    'delay_enabled': False, 'delay_sec': 0.5, 'delay_feedback': 0, 'delay_mix': 0.5,
+    'chorus_enabled': False, 'chorus_rate_hz': 1, 'chorus_depth': 0.25, 'chorus_center_delay': 7,
+    'chorus_feedback': 0, 'chorus_mix': 0.5,
+    'phaser_enabled': False, 'phaser_rate_hz': 1, 'phaser_depth': 0.25, 'phaser_center_frequency': 1300,
+    'phaser_feedback': 0, 'phaser_mix': 0.5,
+    'pitchshift_enabled': False, 'pitchshift_semitones': 0,
+    'compressor_enabled': False, 'compressor_threshold_db': 0, 'compressor_ratio': 1,
+    'compressor_attack_ms': 1, 'compressor_release_ms': 100,
+
+    'distortion_enabled': False, 'distortion_drive_db': 25,
+    'bitcrush_enabled': False, 'bitcrush_bit_depth': 8,
+    'gsm_full_rate_compressor': 'None',
+    'mp3_compressor_enabled': False, 'mp3_compressor_vbr_quality': 2,
+    'resample_method': 'None', 'resample_target_sample_rate': 8000,
+
+    'highpass_filter_enabled': False, 'highpass_filter_cutoff_frequency': 50,
+    'lowpass_filter_enabled': False, 'lowpass_filter_cutoff_frequency': 50,
+    'high_shelf_filter_enabled': False, 'high_shelf_filter_cutoff_hz': 440, 'high_shelf_filter_gain_db': 0,
+    'high_shelf_filter_q': 0.7071,
+    'low_shelf_filter_enabled': False, 'low_shelf_filter_cutoff_hz': 440, 'low_shelf_filter_gain_db': 0,
+    'low_shelf_filter_q': 0.7071,
+    'peak_filter_enabled': False, 'peak_filter_cutoff_hz': 440, 'peak_filter_gain_db': 0, 'peak_filter_q': 0.7071,
+    'ladder_filter_enabled': False, 'ladder_filter_mode': 'LPF12', 'ladder_filter_cutoff_hz': 200,
+    'ladder_filter_resonance': 0, 'ladder_filter_drive': 1,
+    'limiter_enabled': False, 'limiter_threshold_db': -10, 'limiter_release_ms': 100,
+    'clipping_enabled': False, 'clipping_threshold': -6,
+
+    'padding_start_sec': 0, 'padding_end_sec': 0,
+    'time_strech_factor': 1, 'time_strech_pitch_shift_semitones': 0,
+}
+PRESET_KEYS = list(DEFAULT_PRESET)
+
+DEFAULT_BLOCK_SIZE = 65536
+DEFAULT_SEGMENT_SEC = 30 #segment length for parallel rendering
+DEFAULT_CROSSFADE_SEC = 0.05 #overlap between neighbouring segments in parallel rendering
+MAX_WARMUP_RATIO = 0.5 #warm-up per segment is capped at this fraction of the segment, longer ones render serially
+STREAM_FLUSH_MAX_BLOCKS = 64 #upper bound on silent blocks fed to drain plugin latency at end of stream
+THUMBNAIL_WIDTH = 800
+LIVE_BLOCK_SIZE = 512 #live input is regrouped into blocks of this size, adding at most this much buffering latency
+
+#effects whose output depends on how the audio is split into blocks, so streaming them doesn't match rendering the
+#whole clip at once: PitchShift returns silence for small blocks and gaps for large ones, GSM's codec frames drift.
+#Chains using them (or time stretch) have to be rendered in memory
+STREAM_UNSAFE_PLUGINS = (PitchShift, GSMFullRateCompressor)
+
+#output file types and their quality settings, as accepted by pedalboard.io.AudioFile - (choices, default)
+OUTPUT_QUALITIES = {
+    '.wav': ([], None),
+    '.flac': ([str(level) for level in range(9)], '5'), #compression level - lossless either way
+    '.ogg': ([f'{kbps} kbps' for kbps in (64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 500)], '192 kbps'),
+    '.mp3': ([f'V{level}' for level in range(10)] + [f'{kbps} kbps' for kbps in (128, 192, 256, 320)], 'V2'),
+}
+
+def load_preset(preset = None):
+    #preset can be a dict or a path to a JSON file - missing keys are filled in from DEFAULT_PRESET
+    if preset is None:
+        preset = {}
+    elif not isinstance(preset, dict):
+        with open(preset) as f:
+            preset = json.load(f)
+
+    unknown = set(preset) - set(DEFAULT_PRESET)
+    if unknown:
+        raise ValueError(f'Unknown preset parameters: {", ".join(sorted(unknown))}')
+
+    return {**DEFAULT_PRESET, **preset}
+
+def dump_preset(preset):
+    #stable JSON form of the full preset - every parameter, sorted keys, numbers as floats (sliders return 5 or 5.0
+    #for the same setting), so the same settings always serialize to the same text and hash
+    p = load_preset(preset)
+    p = {k: float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else v for k, v in p.items()}
+    return json.dumps(p, sort_keys = True, indent = 1)
+
+def save_preset(preset, path):
+    with open(path, 'w') as f:
+        f.write(dump_preset(preset))
+    return path
+
+def effect_params(preset, effect):
+    #the preset values belonging to one effect, e.g. effect_params(p, 'reverb') -> (reverb_enabled, reverb_room_size, ...)
+    return tuple(preset[k] for k in PRESET_KEYS if k == effect or k.startswith(effect + '_'))
+
+def build_stages(preset):
+    #returns the effect chain as a list of (stage_key, plugin). stage_key identifies the effect and its parameters,
+    #so two chains that share a prefix of stage keys produce the same intermediate audio
+    p = load_preset(preset)
+    stages = []
+
+    def add(effect, plugin):
+        stages.append(((effect,) + effect_params(p, effect), plugin))
+
+    if p['noise_gate_enabled']:
+        add('noise_gate', NoiseGate(p['noise_gate_threshold_db'], p['noise_gate_ratio'], p['noise_gate_attack_ms'],
+            p['noise_gate_release_ms']))
+
+    if p['gain'] != 0:
+        add('gain', Gain(gain_db = p['gain']))
+
+    if p['reverb_enabled']:
+        add('reverb', Reverb(p['reverb_room_size'], p['reverb_damping'], p['reverb_wet_level'], p['reverb_dry_level'],
+            p['reverb_width'], p['reverb_freeze_mode']))
+
+    if p['delay_enabled']:
+        add('delay', Delay(p['delay_sec'], p['delay_feedback'], p['delay_mix']))
+
+    if p['chorus_enabled']:
+        add('chorus', Chorus(p['chorus_rate_hz'], p['chorus_depth'], p['chorus_center_delay'], p['chorus_feedback'],
+            p['chorus_mix']))
+
+    if p['phaser_enabled']:
+        add('phaser', Phaser(p['phaser_rate_hz'], p['phaser_depth'], p['phaser_center_frequency'], p['phaser_feedback'],
+            p['phaser_mix']))
+
+    if p['pitchshift_enabled']:
+        add('pitchshift', PitchShift(p['pitchshift_semitones']))
+
+    if p['compressor_enabled']:
+        add('compressor', Compressor(p['compressor_threshold_db'], p['compressor_ratio'], p['compressor_attack_ms'],
+            p['compressor_release_ms']))
+
+    if p['distortion_enabled']:
+        add('distortion', Distortion(p['distortion_drive_db']))
+
+    if p['bitcrush_enabled']:
+        add('bitcrush', Bitcrush(p['bitcrush_bit_depth']))
+
+    if p['gsm_full_rate_compressor'] != 'None':
+        add('gsm_full_rate_compressor',
+            GSMFullRateCompressor(quality = getattr(Resample.Quality, p['gsm_full_rate_compressor'])))
+
+    if p['mp3_compressor_enabled']:
+        add('mp3_compressor', MP3Compressor(p['mp3_compressor_vbr_quality']))
+
+    if p['resample_method'] != 'None':
+        add('resample', Resample(p['resample_target_sample_rate'], getattr(Resample.Quality, p['resample_method'])))
+
+    if p['highpass_filter_enabled']:
+        add('highpass_filter', HighpassFilter(p['highpass_filter_cutoff_frequency']))
+
+    if p['lowpass_filter_enabled']:
+        add('lowpass_filter', LowpassFilter(p['lowpass_filter_cutoff_frequency']))
+
+    if p['high_shelf_filter_enabled']:
+        add('high_shelf_filter', HighShelfFilter(p['high_shelf_filter_cutoff_hz'], p['high_shelf_filter_gain_db'],
+            p['high_shelf_filter_q']))
+
+    if p['low_shelf_filter_enabled']:
+        add('low_shelf_filter', LowShelfFilter(p['low_shelf_filter_cutoff_hz'], p['low_shelf_filter_gain_db'],
+            p['low_shelf_filter_q']))
+
+    if p['peak_filter_enabled']:
+        add('peak_filter', PeakFilter(p['peak_filter_cutoff_hz'], p['peak_filter_gain_db'], p['peak_filter_q']))
+
+    if p['ladder_filter_enabled']:
+        add('ladder_filter', LadderFilter(getattr(LadderFilter.Mode, p['ladder_filter_mode']),
+            p['ladder_filter_cutoff_hz'], p['ladder_filter_resonance'], p['ladder_filter_drive']))
+
+    if p['limiter_enabled']:
+        add('limiter', Limiter(p['limiter_threshold_db'], p['limiter_release_ms']))
+
+    if p['clipping_enabled']:
+        add('clipping', Clipping(p['clipping_threshold']))
+
+    return stages
+
+def unstreamable_effects(preset):
+    #names of the enabled stages in preset that stream_audio_file can't reproduce - empty if the chain can be streamed
+    p = load_preset(preset)
+    names = [key[0] for key, plugin in build_stages(p) if isinstance(plugin, STREAM_UNSAFE_PLUGINS)]
+    if p['time_strech_factor'] != 1:
+        names.append('time_strech')
+    return names
+
+def build_board(preset):
+    return Pedalboard([plugin for _, plugin in build_stages(preset)])
+
+class BufferPool:
+    #reusable float32 buffers for whole-clip input audio, so each request doesn't allocate (and page in) a fresh
+    #clip-sized array. acquire() hands out a view of a free buffer that is big enough, release() returns it.
+    #Free buffers are capped at max_bytes in total - the oldest are dropped first, and a buffer bigger than the cap
+    #is never kept. Only inputs are pooled: pedalboard plugins allocate their own output arrays (there is no out=
+    #argument), and stage outputs are kept read-only in the StageCache, so they can't be handed out again
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self._free = []
+        self._issued = {} #id -> weakref of buffers currently handed out, so a recycled id can't match
+        self._lock = threading.Lock()
+
+    def acquire(self, shape):
+        size = int(np.prod(shape))
+        with self._lock:
+            fits = [buf for buf in self._free if buf.size >= size]
+            if fits:
+                buf = min(fits, key = lambda b: b.size)
+                self._free.remove(buf)
+                self.num_bytes -= buf.nbytes
+            else:
+                buf = np.empty(size, dtype = np.float32)
+            self._issued[id(buf)] = weakref.ref(buf)
+        return buf[:size].reshape(shape)
+
+    def release(self, array):
+        #only buffers handed out by acquire() are taken back - e.g. read_audio can also return arrays it allocated
+        #itself, which are not flat and can't be reshaped by acquire()
+        buf = array.base if array.base is not None else array
+        with self._lock:
+            ref = self._issued.get(id(buf))
+            if ref is None or ref() is not buf:
+                return
+            del self._issued[id(buf)]
+            if buf.nbytes > self.max_bytes:
+                return
+            self._free.append(buf)
+            self.num_bytes += buf.nbytes
+            while self.num_bytes > self.max_bytes:
+                self.num_bytes -= self._free.pop(0).nbytes
+
+def to_float32(audio_data):
+    #Gradio numpy audio - (samples,) or (samples, channels), int16/int32 or float - to float32 (channels, samples),
+    #scaled and transposed in one pass without intermediate float64 arrays
+    if np.issubdtype(audio_data.dtype, np.integer):
+        out = np.empty(audio_data.T.shape, dtype = np.float32)
+        np.multiply(audio_data.T, 1.0 / (np.iinfo(audio_data.dtype).max + 1), out = out, casting = 'unsafe')
+        return out
+    return np.ascontiguousarray(audio_data.T, dtype = np.float32)
+
+def to_int16(audio_data):
+    #float32 (channels, samples) to int16 (samples, channels) for Gradio - clipped, so overs don't wrap around
+    out = np.clip(audio_data.T, -1.0, 32767 / 32768)
+    out *= 32768
+    return out.astype(np.int16)
+
+def pad_audio(audio_data, sample_rate, padding_start_sec, padding_end_sec, out = None):
+    #copy audio into one float32 buffer with silence either side (out can be a preallocated buffer of the padded size)
+    #works for (samples,) mono and (channels, samples) arrays
+    start = int(sample_rate * padding_start_sec) if padding_start_sec > 0 else 0
+    end = int(sample_rate * padding_end_sec) if padding_end_sec > 0 else 0
+    if start == 0 and end == 0 and out is None:
+        return np.ascontiguousarray(audio_data, dtype = np.float32)
+
+    num_samples = audio_data.shape[-1]
+    if out is None:
+        out = np.empty(audio_data.shape[:-1] + (start + num_samples + end,), dtype = np.float32)
+
+    out[..., :start] = 0
+    out[..., start:start + num_samples] = audio_data
+    out[..., start + num_samples:] = 0
+    return out
+
+def read_audio(path, padding_start_sec = 0, padding_end_sec = 0, buffer_pool = None, block_size = DEFAULT_BLOCK_SIZE):
+    #decode a whole file as float32 (channels, samples), at its native bit depth, block by block straight into one
+    #padded buffer (taken from buffer_pool if given) - returns (audio_data, sample_rate)
+    with AudioFile(path) as f:
+        sample_rate = f.samplerate
+        if not f.exact_duration_known:
+            #e.g. some MP3s - the frame count is only an estimate until the whole file has been read
+            audio_data = pad_audio(f.read(f.frames), sample_rate, padding_start_sec, padding_end_sec)
+            return audio_data, sample_rate
+
+        start = int(sample_rate * padding_start_sec) if padding_start_sec > 0 else 0
+        end = int(sample_rate * padding_end_sec) if padding_end_sec > 0 else 0
+        shape = (f.num_channels, start + f.frames + end)
+        audio_data = buffer_pool.acquire(shape) if buffer_pool else np.empty(shape, dtype = np.float32)
+
+        audio_data[:, :start] = 0
+        pos = start
+        while f.tell() < f.frames:
+            block = f.read(block_size)
+            audio_data[:, pos:pos + block.shape[1]] = block
+            pos += block.shape[1]
+        audio_data[:, pos:] = 0
+
+    return audio_data, sample_rate
+
+def encoder_options(path, bit_depth = 16, quality = None):
+    #AudioFile write arguments for the file type of path. bit_depth 16 / 24 are integer PCM (clipped to +-1.0), 32 is
+    #float so nothing is clipped or quantized - FLAC has no float format, so it gets 24-bit. Lossy formats ignore it
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.flac':
+        bit_depth = min(bit_depth, 24)
+    if extension not in OUTPUT_QUALITIES or not OUTPUT_QUALITIES[extension][0]:
+        quality = None
+    return {'bit_depth': bit_depth, 'quality': quality}
+
+def write_audio(path, audio_data, sample_rate, bit_depth = 16, quality = None, block_size = DEFAULT_BLOCK_SIZE):
+    #written a block at a time, so the encoder's conversion buffers stay small for long clips
+    audio_data = np.atleast_2d(audio_data)
+    with AudioFile(path, 'w', sample_rate, audio_data.shape[0], **encoder_options(path, bit_depth, quality)) as out:
+        for start in range(0, audio_data.shape[-1], block_size):
+            out.write(audio_data[:, start:start + block_size])
+    return path
+
+class WaveformThumbnail:
+    #min / max envelope of the output, collected block by block as it is encoded. Drawing the waveform from this
+    #doesn't need the output file to be decoded again
+
+    def __init__(self, num_frames, width = THUMBNAIL_WIDTH):
+        self.frames_per_bin = max(1, math.ceil(num_frames / width))
+        self.frames = 0
+        self.highs = []
+        self.lows = []
+
+    def add(self, block):
+        block = np.atleast_2d(block)
+        if block.shape[-1] == 0:
+            return
+        highs, lows = block.max(axis = 0), block.min(axis = 0)
+
+        #offsets in this block where a new bin starts - the first one may continue the last bin of the previous block
+        first_bin = self.frames // self.frames_per_bin
+        starts = np.r_[0, np.arange((first_bin + 1) * self.frames_per_bin - self.frames, block.shape[-1],
+            self.frames_per_bin)]
+        highs, lows = np.maximum.reduceat(highs, starts), np.minimum.reduceat(lows, starts)
+        if len(self.highs) > first_bin:
+            self.highs[-1] = max(self.highs[-1], highs[0])
+            self.lows[-1] = min(self.lows[-1], lows[0])
+            highs, lows = highs[1:], lows[1:]
+
+        self.highs += highs.tolist()
+        self.lows += lows.tolist()
+        self.frames += block.shape[-1]
+
+    def image(self, height = 96, color = (255, 124, 0)):
+        #RGB uint8 array, one column per bin
+        rows = np.linspace(1, -1, height)[:, None] #amplitude at each pixel row
+        pixel = 1 / height #so silent / very quiet bins still draw a line
+        mask = (rows <= np.clip(self.highs, -1, 1) + pixel) & (rows >= np.clip(self.lows, -1, 1) - pixel)
+        image = np.full((height, len(self.highs), 3), 255, dtype = np.uint8)
+        image[mask] = color
+        return image
+
+def read_excerpt(path, start_sec, duration_sec):
+    #decode only the requested part of a file - returns (audio_data, sample_rate)
+    with AudioFile(path) as f:
+        num_frames = int(f.samplerate * duration_sec)
+        f.seek(min(int(f.samplerate * start_sec), max(f.frames - num_frames, 0)))
+        return f.read(num_frames), f.samplerate
+
+def time_stretch_stage(preset):
+    #time stretch is applied after the board - returns it as a (stage_key, fn) stage, or None if disabled
+    p = load_preset(preset)
+    if p['time_strech_factor'] == 1:
+        return None
+
+    def stretch(audio_data, sample_rate):
+        # a few more args for this function per: https://spotify.github.io/pedalboard/reference/pedalboard.html#pedalboard.time_stretch
+        return time_stretch(audio_data, sample_rate, p['time_strech_factor'], p['time_strech_pitch_shift_semitones'])
+
+    return (('time_strech',) + effect_params(p, 'time_strech'), stretch)
+
+def timed(timer, stage):
+    #timer is an optional pedalboard_metrics.RequestTimer
+    return timer.time(stage) if timer is not None else nullcontext()
+
+def render_stages(audio_data, sample_rate, stages, cache = None, timer = None):
+    #run audio through a list of (stage_key, fn) stages one at a time. With a StageCache, each stage output except the
+    #last is cached and processing resumes after the longest prefix of stages already in the cache. The final output
+    #isn't worth caching (identical repeats are served by the render cache), and on long clips it would evict the
+    #prefixes that tweaking the last stage resumes from
+    if cache is None:
+        for stage_key, fn in stages:
+            with timed(timer, stage_key[0]):
+                audio_data = fn(audio_data, sample_rate)
+        return audio_data
+
+    start = 0
+    with timed(timer, 'cache lookup'):
+        keys = []
+        key = hash_audio(audio_data, sample_rate)
+        for stage_key, _ in stages:
+            key = chain_key(key, stage_key)
+            keys.append(key)
+
+        for i in reversed(range(len(stages))):
+            cached = cache.get(keys[i])
+            if cached is not None:
+                start, audio_data = i + 1, cached
+                break
+
+    for i in range(start, len(stages)):
+        with timed(timer, stages[i][0][0]):
+            audio_data = stages[i][1](audio_data, sample_rate)
+        if i < len(stages) - 1:
+            cache.put(keys[i], audio_data)
+
+    return audio_data
+
+def process_array(audio_data, sample_rate, preset, cache = None, timer = None):
+    #audio_data is float, shape (channels, samples) or (samples,) for mono
+    p = load_preset(preset)
+    with timed(timer, 'padding'):
+        audio_data = pad_audio(audio_data, sample_rate, p['padding_start_sec'], p['padding_end_sec'])
+    return render_audio(audio_data, sample_rate, p, cache, timer)
+
+def render_audio(audio_data, sample_rate, preset, cache = None, timer = None):
+    #run already padded float32 audio through the effect chain and time stretch, one stage at a time
+    #so each stage can be timed, and its output cached and reused on the next render
+    p = load_preset(preset)
+    stages = build_stages(p)
+    stretch = time_stretch_stage(p)
+    if stretch:
+        stages.append(stretch)
+
+    return render_stages(audio_data, sample_rate, stages, cache, timer)
+
+def decay_sec(feedback, loop_sec):
+    #time for a feedback loop to die away by 60dB
+    return loop_sec * math.log(1e-3) / math.log(feedback) if feedback > 0 else loop_sec
+
+def stage_warmup_sec(effect, preset):
+    #how much audio before a segment a stage needs to see for its state to match an uninterrupted render -
+    #None if the stage can't be split into independent segments (LFO phase, codec framing, frozen / near-infinite tails)
+    p = preset
+    if effect in ('gain', 'distortion', 'bitcrush', 'clipping'):
+        return 0 #no state
+    if effect in ('highpass_filter', 'lowpass_filter', 'high_shelf_filter', 'low_shelf_filter', 'peak_filter'):
+        return 0.1
+    if effect == 'ladder_filter':
+        return 0.1 + p['ladder_filter_resonance'] #resonance rings for longer
+    if effect in ('noise_gate', 'compressor', 'limiter'):
+        #envelope followers settle within a few release times
+        release_ms = max(p.get(f'{effect}_release_ms', 0), p.get(f'{effect}_attack_ms', 0))
+        return 0.05 + 5 * release_ms / 1000
+    if effect == 'reverb':
+        if p['reverb_freeze_mode'] >= 0.5:
+            return None
+        #freeverb comb filters loop every ~35ms with feedback room_size * 0.28 + 0.7
+        return decay_sec(p['reverb_room_size'] * 0.28 + 0.7, 0.037) + 0.1
+    if effect == 'delay':
+        if p['delay_feedback'] >= 0.99:
+            return None
+        return decay_sec(p['delay_feedback'], p['delay_sec']) + p['delay_sec']
+    return None #chorus, phaser, pitchshift, gsm, mp3, resample, time stretch
+
+def render_segment(audio_data, sample_rate, preset, stage_indices, start, end, warmup):
+    #runs in a worker thread - renders audio_data[start - warmup:end] through fresh copies of the given stages
+    #(plugins are stateful so every segment needs its own), and returns the part from start onwards
+    stages = build_stages(preset)
+    segment = audio_data[:, max(start - warmup, 0):end]
+    for i in stage_indices:
+        segment = stages[i][1](segment, sample_rate)
+    return segment[:, start - max(start - warmup, 0):]
+
+def render_segmented(pool, audio_data, sample_rate, preset, stage_indices, warmup, segment_len, crossfade):
+    #every segment after the first starts `crossfade` samples early, and is blended with the end of the previous one
+    num_samples = audio_data.shape[1]
+    bounds = [(start, min(start + segment_len, num_samples)) for start in range(0, num_samples, segment_len)]
+    futures = [pool.submit(render_segment, audio_data, sample_rate, preset, stage_indices,
+        max(start - crossfade, 0), end, warmup) for start, end in bounds]
+
+    out_audio = np.empty(audio_data.shape, dtype = np.float32)
+    fade_in = np.linspace(0, 1, crossfade, dtype = np.float32)
+    for (start, end), future in zip(bounds, futures):
+        segment = future.result()
+        if start == 0:
+            out_audio[:, :end] = segment
+            continue
+
+        overlap = out_audio[:, start - crossfade:start]
+        overlap += (segment[:, :crossfade] - overlap) * fade_in
+        out_audio[:, start:end] = segment[:, crossfade:]
+
+    return out_audio
+
+def render_parallel(audio_data, sample_rate, preset, workers = None, segment_sec = DEFAULT_SEGMENT_SEC,
+    crossfade_sec = DEFAULT_CROSSFADE_SEC, timer = None):
+    #like render_audio, but each run of consecutive segmentable stages is split into segments rendered concurrently.
+    #Each segment is preceded by enough warm-up audio for filter / compressor / reverb state to settle, then trimmed,
+    #and neighbouring segments are joined with a short crossfade. Stages that can't be segmented run serially
+    p = load_preset(preset)
+    mono = audio_data.ndim == 1
+    audio_data = np.atleast_2d(audio_data)
+    num_samples = audio_data.shape[1]
+    segment_len = max(int(sample_rate * segment_sec), 1)
+    crossfade = min(int(sample_rate * crossfade_sec), segment_len)
+
+    #group stages into runs: [(stage indices, warmup seconds or None for serial), ...]. Every segment re-renders its
+    #warm-up, so a stage (e.g. a long delay with high feedback) whose warm-up is over the cap runs serially, and a run
+    #of stacked stages, whose warm-ups add up, is split before it goes over the cap
+    max_warmup_sec = MAX_WARMUP_RATIO * segment_len / sample_rate
+    stages = build_stages(p)
+    groups = []
+    for i, (stage_key, _) in enumerate(stages):
+        warmup_sec = stage_warmup_sec(stage_key[0], p)
+        if warmup_sec is not None and warmup_sec > max_warmup_sec:
+            warmup_sec = None
+        if (warmup_sec is not None and groups and groups[-1][1] is not None
+                and groups[-1][1] + warmup_sec <= max_warmup_sec):
+            groups[-1] = (groups[-1][0] + [i], groups[-1][1] + warmup_sec)
+        else:
+            groups.append(([i], warmup_sec))
+
+    with ThreadPoolExecutor(max_workers = workers or os.cpu_count()) as pool:
+        for indices, warmup_sec in groups:
+            name = '+'.join(stages[i][0][0] for i in indices)
+            if warmup_sec is None or num_samples <= segment_len:
+                with timed(timer, name):
+                    for i in indices:
+                        audio_data = np.atleast_2d(stages[i][1](audio_data, sample_rate))
+                continue
+
+            with timed(timer, f'{name} (parallel)'):
+                audio_data = render_segmented(pool, audio_data, sample_rate, p, indices, int(sample_rate * warmup_sec),
+                    segment_len, crossfade)
+
+    stretch = time_stretch_stage(p)
+    if stretch:
+        with timed(timer, stretch[0][0]):
+            audio_data = stretch[1](audio_data, sample_rate)
+
+    return audio_data[0] if mono else audio_data
+
+def stream_audio_file(board, in_path, out_path, block_size, padding_start_sec = 0, padding_end_sec = 0, bit_depth = 16,
+    timer = None, quality = None, thumbnail = False):
+    #read, process and write the audio one block at a time, so memory use depends on block size and not clip length
+    #the same board is used for every block with reset = False, so reverb/delay/compressor state carries across blocks
+    #with thumbnail = True returns (out_path, WaveformThumbnail of the output) instead of just out_path
+    unsafe = [type(plugin).__name__ for plugin in board if isinstance(plugin, STREAM_UNSAFE_PLUGINS)]
+    if unsafe:
+        raise ValueError(f'{", ".join(unsafe)} can\'t be streamed block by block - render the whole clip instead')
+    board.reset()
+
+    with AudioFile(in_path) as f:
+        sample_rate = f.samplerate
+        num_channels = f.num_channels
+        silence = np.zeros((num_channels, block_size), dtype = np.float32)
+        waveform = WaveformThumbnail(f.frames + int(sample_rate * (padding_start_sec + padding_end_sec)))
+
+        with AudioFile(out_path, 'w', sample_rate, num_channels, **encoder_options(out_path, bit_depth, quality)) as out:
+            frames_in = 0
+            frames_out = 0
+
+            def write_block(block):
+                nonlocal frames_in, frames_out
+                frames_in += block.shape[1]
+                with timed(timer, 'effects (streamed)'):
+                    out_block = board(block, sample_rate, reset = False)
+                with timed(timer, 'encode'):
+                    out.write(out_block)
+                    waveform.add(out_block)
+                frames_out += out_block.shape[1]
+
+            def silence_blocks(num_frames):
+                for start in range(0, num_frames, block_size):
+                    yield silence[:, :min(block_size, num_frames - start)]
+
+            def input_blocks():
+                yield from silence_blocks(int(sample_rate * padding_start_sec))
+                while f.tell() < f.frames:
+                    with timed(timer, 'decode'):
+                        block = f.read(block_size)
+                    yield block
+                yield from silence_blocks(int(sample_rate * padding_end_sec))
+
+            #the board only lines up latency correctly if no block is longer than the first one, so padding and
+            #decoded audio are regrouped into blocks of exactly block_size (only the last one is shorter)
+            pending = []
+            pending_frames = 0
+            for block in input_blocks():
+                pending.append(block)
+                pending_frames += block.shape[1]
+                if pending_frames >= block_size:
+                    joined = pending[0] if len(pending) == 1 else np.concatenate(pending, axis = 1)
+                    for start in range(0, pending_frames - block_size + 1, block_size):
+                        write_block(joined[:, start:start + block_size])
+                    pending_frames -= start + block_size
+                    pending = [joined[:, start + block_size:]] if pending_frames else []
+            if pending_frames:
+                write_block(np.concatenate(pending, axis = 1))
+
+            #plugins with latency (MP3Compressor, Resample...) hold back some samples - feed silence
+            #until the output is as long as the input, same as processing the whole clip at once
+            for _ in range(STREAM_FLUSH_MAX_BLOCKS):
+                if frames_out >= frames_in:
+                    break
+                with timed(timer, 'effects (streamed)'):
+                    out_block = board(silence, sample_rate, reset = False)[:, :frames_in - frames_out]
+                with timed(timer, 'encode'):
+                    out.write(out_block)
+                    waveform.add(out_block)
+                frames_out += out_block.shape[1]
+
+    return (out_path, waveform) if thumbnail else out_path
+
+class LiveProcessor:
+    #processes a live stream block by block through one persistent board - plugin state carries over between blocks,
+    #so reverb and delay tails keep ringing. Padding and time stretch don't apply to a live stream. Stages that can't
+    #be streamed (STREAM_UNSAFE_PLUGINS) are bypassed and listed in stats(), rather than silently producing nothing
+
+    def __init__(self, preset, history = 100, block_size = LIVE_BLOCK_SIZE):
+        stages = build_stages(preset)
+        self.stage_keys = [key for key, _ in stages]
+        self.bypassed = [key[0] for key, plugin in stages if isinstance(plugin, STREAM_UNSAFE_PLUGINS)]
+        self.board = Pedalboard([plugin for _, plugin in stages if not isinstance(plugin, STREAM_UNSAFE_PLUGINS)])
+        #microphone chunks vary in size, and the board only lines up latency if no block is longer than the first -
+        #so chunks are regrouped into fixed size blocks, and the leftover waits for the next chunk
+        self.block_size = block_size
+        self.pending = None
+        self.frames_in = 0
+        self.frames_out = 0
+        self.block_sec = deque(maxlen = history) #audio duration of recent blocks
+        self.process_sec = deque(maxlen = history) #time taken to process recent blocks
+
+    def matches(self, preset):
+        return self.stage_keys == [key for key, _ in build_stages(preset)]
+
+    def process(self, block, sample_rate):
+        start = time.perf_counter()
+        block = np.atleast_2d(block)
+        self.block_sec.append(block.shape[-1] / sample_rate)
+        self.frames_in += block.shape[-1]
+        if self.pending is not None:
+            block = np.concatenate([self.pending, block], axis = 1)
+
+        num_frames = block.shape[-1] // self.block_size * self.block_size
+        self.pending = block[:, num_frames:]
+        out_blocks = [self.board(block[:, i:i + self.block_size], sample_rate, reset = False)
+            for i in range(0, num_frames, self.block_size)]
+        out_block = np.concatenate(out_blocks, axis = 1) if out_blocks else block[:, :0]
+
+        self.process_sec.append(time.perf_counter() - start)
+        self.frames_out += out_block.shape[-1]
+        return out_block
+
+    def stats(self, sample_rate):
+        #per-block processing time, and the estimated end-to-end latency: a block has to be fully captured before
+        #it is processed, part of it may wait for the next chunk to fill a block, then plugins with lookahead
+        #(MP3Compressor, Resample...) hold back some more samples
+        block_sec = self.block_sec[-1]
+        process_sec = self.process_sec[-1]
+        buffer_sec = self.block_size / sample_rate
+        plugin_latency_sec = max(self.frames_in - self.frames_out - self.pending.shape[-1], 0) / sample_rate
+        return {
+            'block_ms': 1000 * block_sec,
+            'process_ms': 1000 * process_sec,
+            'max_process_ms': 1000 * max(self.process_sec),
+            'realtime_load': sum(self.process_sec) / sum(self.block_sec), #fraction of the realtime budget used
+            'buffer_ms': 1000 * buffer_sec,
+            'plugin_latency_ms': 1000 * plugin_latency_sec,
+            'latency_ms': 1000 * (block_sec + buffer_sec + process_sec + plugin_latency_sec),
+            'bypassed': self.bypassed,
+        }
+
+def process_file(in_path, out_path, preset, block_size = DEFAULT_BLOCK_SIZE, bit_depth = 16, quality = None):
+    #render one file to another, returns the input duration in seconds. The output type follows out_path's extension
+    p = load_preset(preset)
+
+    with AudioFile(in_path) as f:
+        duration_sec = f.duration
+
+    if not unstreamable_effects(p):
+        stream_audio_file(build_board(p), in_path, out_path, block_size, p['padding_start_sec'], p['padding_end_sec'],
+            bit_depth, quality = quality)
+        return duration_sec
+
+    #time stretch, pitch shift and GSM need the whole clip in memory to match the GUI render
+    audio_data, sample_rate = read_audio(in_path, p['padding_start_sec'], p['padding_end_sec'])
+    write_audio(out_path, render_audio(audio_data, sample_rate, p), sample_rate, bit_depth, quality)
+
+    return duration_sec
@@ -1,162 +1,363 @@
 import gradio as gr
-import numpy as np
-from pedalboard import (Pedalboard, Chorus, Reverb, Gain, Phaser, Compressor, HighpassFilter, LowpassFilter,
-    Distortion, Delay, Bitcrush, MP3Compressor, PitchShift, Limiter, Clipping, time_stretch, 
-    GSMFullRateCompressor, Resample, LadderFilter, LowShelfFilter, HighShelfFilter, PeakFilter, NoiseGate)
+import os
+import tempfile
+import time
+import zipfile
 from pedalboard.io import AudioFile
+from pedalboard_cache import RenderCache, StageCache, hash_file, render_key
+import numpy as np
+from pedalboard_engine import (OUTPUT_QUALITIES, PRESET_KEYS, BufferPool, LiveProcessor, WaveformThumbnail, build_board,
+    dump_preset, load_preset, process_array, read_audio, read_excerpt, render_audio, render_parallel, save_preset,
+    stream_audio_file, timed, to_float32, to_int16, unstreamable_effects, write_audio)
+from pedalboard_jobs import RenderPool
+from pedalboard_metrics import Metrics, RenderTimeout, RequestTimer
+from pedalboard_sweep import expand_sweep, parse_sweep, render_sweep, variant_name
+
+STAGE_CACHE_MAX_MB = 1024 #memory cap for intermediate buffers kept between renders, least recently used are evicted first
+stage_cache = StageCache(STAGE_CACHE_MAX_MB * 1024 * 1024)
+BUFFER_POOL_MAX_MB = 256 #free input buffers kept for reuse between requests, instead of allocating one per clip
+buffer_pool = BufferPool(BUFFER_POOL_MAX_MB * 1024 * 1024)
+
+#finished renders are kept on disk keyed by input file hash + full preset, so re-rendering the same clip with the same
+#settings is served from disk without any processing. Set RENDER_CACHE_DIR = None to disable
+RENDER_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'pedalboard_gui_render_cache')
+RENDER_CACHE_MAX_MB = 4096
+render_cache = RenderCache(RENDER_CACHE_DIR, RENDER_CACHE_MAX_MB * 1024 * 1024) if RENDER_CACHE_DIR else None
+
+METRICS_PORT = 7681 #aggregate counters / latency histograms at http://127.0.0.1:7681/metrics
+METRICS_LOG_PATH = None #set to e.g. 'render_metrics.jsonl' to also log every request's stage timings and preset
+metrics = Metrics(METRICS_LOG_PATH)
+
+#full renders run on a fixed pool of workers - requests beyond that wait in Gradio's queue, which shows each user
+#their position. Once MAX_QUEUE_SIZE requests are waiting, new ones are turned away instead of slowing everyone down
+RENDER_WORKERS = 4
+RENDER_EXECUTOR = 'thread' #'thread' or 'process', see pedalboard_jobs.RenderPool
+MAX_QUEUE_SIZE = 32
+RENDER_BUDGET_SEC = 300 #a render taking longer than this is cancelled
+PREVIEW_BUDGET_SEC = 30
+MAX_CLIP_SEC = 30 * 60 #longest clip accepted in Input Audio
+MAX_LARGE_FILE_SEC = 4 * 60 * 60 #longest file accepted in Large File Mode
+MAX_SWEEP_AUDIO_SEC = 60 * 60 #longest clip length x number of variants accepted in a Parameter Sweep
+render_pool = RenderPool(RENDER_WORKERS, RENDER_EXECUTOR)
+
+RENDER_STATS_HEADERS = ['Stage', 'Time ms', '% of Total', 'Samples/sec', 'Realtime Factor']
+SWEEP_STATS_HEADERS = ['Variant', 'Stages', 'Shared Stages', 'Render ms', 'Standalone ms']
+
+def temp_output_path(suffix = '.wav'):
+    return tempfile.NamedTemporaryFile(suffix = suffix, delete = False).name
+
+def check_admission(audio_in, large_file_in):
+    #turn away clips that are too long before they take up a worker - returns the clip duration in seconds
+    if large_file_in is not None:
+        path, limit_sec, mode = large_file_in, MAX_LARGE_FILE_SEC, 'Large File Mode'
+    elif audio_in is not None:
+        path, limit_sec, mode = audio_in, MAX_CLIP_SEC, 'Input Audio'
+    else:
+        return None
+
+    with AudioFile(path) as f:
+        duration_sec = f.duration
+
+    if duration_sec > limit_sec:
+        metrics.inc('render_rejected_total')
+        raise gr.Error(f'Clip is {duration_sec / 60:.1f} minutes long - {mode} accepts up to {limit_sec / 60:.0f} minutes')
+    return duration_sec
+
+def process_audio(audio_in, large_file_in, stream_block_size, output_format, output_quality, output_bit_depth,
+    parallel_render, segment_sec, *preset_values):
+    #preset_values are the effect controls, in PRESET_KEYS order
+    #returns (output file path, waveform thumbnail, time breakdown, output / cache info)
+    preset = dict(zip(PRESET_KEYS, preset_values))
+    check_admission(audio_in, large_file_in)
+    timer = RequestTimer(RENDER_BUDGET_SEC)
+
+    input_path = large_file_in if large_file_in is not None else audio_in
+    cache_key = None
+    if render_cache is not None and input_path is not None:
+        with timer.time('render cache lookup'):
+            cache_key = render_key(hash_file(input_path), dump_preset(preset), large_file_in is not None,
+                output_format, output_quality, output_bit_depth, segment_sec if parallel_render else None)
+            out_path = render_cache.get(cache_key, lambda: temp_output_path(output_format))
+            thumbnail_path = out_path and render_cache.get(cache_key + '-thumbnail', lambda: temp_output_path('.npy'),
+                count = False)
+
+        if out_path is not None:
+            metrics.inc('render_cache_hits_total')
+            with AudioFile(out_path) as f:
+                audio_sec, sample_rate = f.duration, f.samplerate
+            metrics.observe('render', timer, audio_sec, preset = preset, cache_hit = True)
+            thumbnail = np.load(thumbnail_path) if thumbnail_path else None
+            return out_path, thumbnail, timer.breakdown(audio_sec, sample_rate), render_info(out_path, True)
+        metrics.inc('render_cache_misses_total')
+
+    try:
+        out_path, thumbnail, audio_sec, sample_rate, timer.stages = render_pool.run(render_file, audio_in,
+            large_file_in, stream_block_size, output_format, output_quality, output_bit_depth, parallel_render,
+            segment_sec, preset, timer, budget_sec = RENDER_BUDGET_SEC)
+    except Exception as e:
+        metrics.observe('render', timer, 0, error = e, preset = preset)
+        if isinstance(e, (RenderTimeout, ValueError)): #ValueError - e.g. a sample rate the output format can't store
+            raise gr.Error(str(e))
+        raise
+
+    if cache_key is not None:
+        with timer.time('render cache store'):
+            render_cache.put(cache_key, out_path)
+            thumbnail_path = temp_output_path('.npy')
+            np.save(thumbnail_path, thumbnail)
+            render_cache.put(cache_key + '-thumbnail', thumbnail_path)
+
+    metrics.observe('render', timer, audio_sec, preset = preset, cache_hit = False)
+    return out_path, thumbnail, timer.breakdown(audio_sec, sample_rate), render_info(out_path, False)
+
+def render_info(out_path, cache_hit):
+    info = f'Output file: {os.path.getsize(out_path) / 2 ** 20:.1f} MB {os.path.splitext(out_path)[1][1:].upper()}.'
+    if render_cache is None:
+        return info
+    return (f'{info} Render cache {"hit - served from disk" if cache_hit else "miss"}. {render_cache.hits} hits / '
+        f'{render_cache.misses} misses ({100 * render_cache.hit_rate():.0f}% hit rate), '
+        f'{render_cache.num_bytes / 2 ** 20:.0f} of {render_cache.max_bytes / 2 ** 20:.0f} MB used')
+
+def output_quality_choices(output_format):
+    choices, default = OUTPUT_QUALITIES[output_format]
+    return gr.update(choices = choices, value = default, interactive = bool(choices))
+
+def save_preset_file(*preset_values):
+    return save_preset(dict(zip(PRESET_KEYS, preset_values)), temp_output_path('.json'))
+
+def load_preset_file(path):
+    #returns the control values in PRESET_KEYS order
+    try:
+        preset = load_preset(path)
+    except ValueError as e: #also covers malformed JSON
+        raise gr.Error(f'Could not load preset: {e}')
+    return [preset[k] for k in PRESET_KEYS]
+
+def render_file(audio_in, large_file_in, stream_block_size, output_format, output_quality, output_bit_depth,
+    parallel_render, segment_sec, preset, timer):
+    #runs on a render_pool worker - returns (output path, waveform thumbnail image, seconds of audio processed,
+    #sample rate, stage timings). The output is encoded straight to a temp file, which Gradio serves by path
+    if large_file_in is not None:
+        #large file mode - stream from the uploaded file to a temp file instead of decoding the whole clip into memory
+        unstreamable = unstreamable_effects(preset)
+        if unstreamable:
+            raise gr.Error(f'{", ".join(unstreamable)} needs the whole clip in memory, so it is not supported in '
+                'Large File Mode - use Input Audio instead')
+
+        with AudioFile(large_file_in) as f:
+            sample_rate = f.samplerate
+            audio_sec = f.duration + preset['padding_start_sec'] + preset['padding_end_sec']
+
+        out_path, thumbnail = stream_audio_file(build_board(preset), large_file_in, temp_output_path(output_format),
+            int(stream_block_size), preset['padding_start_sec'], preset['padding_end_sec'], output_bit_depth, timer,
+            output_quality, thumbnail = True)
+        return out_path, thumbnail.image(), audio_sec, sample_rate, timer.stages
+
+    if audio_in is None:
+        raise gr.Error('Upload / record some input audio first')
+
+    #decoded as float32 at the file's native resolution, straight into one padded buffer - no int16 round trip
+    with timed(timer, 'decode + padding'):
+        audio_data, sample_rate = read_audio(audio_in, preset['padding_start_sec'], preset['padding_end_sec'], buffer_pool)
+    try:
+        if parallel_render:
+            out_audio = render_parallel(audio_data, sample_rate, preset, segment_sec = segment_sec, timer = timer)
+        else:
+            out_audio = render_audio(audio_data, sample_rate, preset, cache = stage_cache, timer = timer)
+        with timed(timer, 'encode'):
+            out_path = write_audio(temp_output_path(output_format), out_audio, sample_rate, output_bit_depth,
+                output_quality)
+            thumbnail = WaveformThumbnail(out_audio.shape[-1])
+            thumbnail.add(out_audio)
+        return out_path, thumbnail.image(), audio_data.shape[-1] / sample_rate, sample_rate, timer.stages
+    finally:
+        buffer_pool.release(audio_data)
+
+def process_sweep(audio_in, sweep_text, output_format, output_quality, output_bit_depth, *preset_values):
+    #render every combination of the swept values - returns (zip of all outputs, individual files, stats, summary)
+    preset = dict(zip(PRESET_KEYS, preset_values))
+    if audio_in is None:
+        raise gr.Error('Upload / record some input audio first')
+
+    try:
+        variants = expand_sweep(preset, parse_sweep(sweep_text))
+    except ValueError as e:
+        raise gr.Error(str(e))
+
+    duration_sec = check_admission(audio_in, None)
+    #every variant of the clip is rendered, so the limit is on the total amount of audio
+    if duration_sec * len(variants) > MAX_SWEEP_AUDIO_SEC:
+        metrics.inc('render_rejected_total')
+        raise gr.Error(f'{len(variants)} variants of a {duration_sec / 60:.1f} minute clip is too much audio for one sweep '
+            f'- the limit is {MAX_SWEEP_AUDIO_SEC / 60:.0f} minutes in total')
+    timer = RequestTimer(RENDER_BUDGET_SEC)
+    try:
+        zip_path, out_paths, stats, timer.stages = render_pool.run(render_sweep_files, audio_in, variants,
+            output_format, output_quality, output_bit_depth, timer, budget_sec = RENDER_BUDGET_SEC)
+    except Exception as e:
+        metrics.observe('sweep', timer, 0, error = e, preset = preset, sweep = sweep_text)
+        if isinstance(e, (RenderTimeout, ValueError)):
+            raise gr.Error(str(e))
+        raise
+
+    total_sec = timer.total_sec()
+    standalone_sec = sum(s['standalone_sec'] for s in stats)
+    metrics.observe('sweep', timer, duration_sec * len(variants), preset = preset, sweep = sweep_text,
+        variants = len(variants))
+
+    rows = [[os.path.basename(path), s['stages'], s['shared_stages'], round(1000 * s['render_sec'], 1),
+        round(1000 * s['standalone_sec'], 1)] for path, s in zip(out_paths, stats)]
+    summary = (f'{len(variants)} variants rendered in {total_sec:.2f} s total. '
+        f'Rendering each one separately would have taken {standalone_sec:.2f} s of processing')
+    return zip_path, out_paths, rows, summary
+
+def render_sweep_files(audio_in, variants, output_format, output_quality, output_bit_depth, timer):
+    #runs on a render_pool worker - the input is decoded once and shared by every variant
+    with timed(timer, 'decode'):
+        audio_data, sample_rate = read_audio(audio_in, buffer_pool = buffer_pool)
+
+    out_dir = tempfile.mkdtemp(prefix = 'sweep_')
+    out_paths = [os.path.join(out_dir, variant_name(i, overrides) + output_format)
+        for i, (overrides, _) in enumerate(variants)]
+    encode_sec = []
+
+    def encode(v, out_audio):
+        #called on a sweep worker as soon as variant v is finished, so finished variants aren't all held in memory
+        start = time.perf_counter()
+        write_audio(out_paths[v], out_audio, sample_rate, output_bit_depth, output_quality)
+        encode_sec.append(time.perf_counter() - start)
+
+    try:
+        stats = render_sweep(audio_data, sample_rate, [preset for _, preset in variants], encode, timer = timer)
+        timer.add('encode', sum(encode_sec))
+
+        with timed(timer, 'zip'):
+            zip_path = os.path.join(out_dir, 'sweep.zip')
+            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as z:
+                for out_path in out_paths:
+                    z.write(out_path, os.path.basename(out_path))
+    finally:
+        buffer_pool.release(audio_data)
+
+    return zip_path, out_paths, stats, timer.stages
+
+def process_preview(audio_in, large_file_in, preview_start_sec, preview_duration_sec, *preset_values):
+    #render a short excerpt through the same chain - only the excerpt is decoded and processed,
+    #so preview latency is bounded by the excerpt length, not the length of the upload
+    preset = dict(zip(PRESET_KEYS, preset_values))
+
+    in_path = large_file_in if large_file_in is not None else audio_in
+    if in_path is None:
+        raise gr.Error('Upload / record some input audio first')
+
+    timer = RequestTimer(PREVIEW_BUDGET_SEC)
+    try:
+        with timed(timer, 'decode'):
+            audio_data, sample_rate = read_excerpt(in_path, preview_start_sec, preview_duration_sec)
+        out_audio = process_array(audio_data, sample_rate, preset, cache = stage_cache, timer = timer)
+        with timed(timer, 'encode'):
+            out_path = write_audio(temp_output_path(), out_audio, sample_rate, 32) #float, the preview is short
+    except RenderTimeout as e:
+        metrics.observe('preview', timer, 0, error = e)
+        raise gr.Error(str(e))
+
+    metrics.observe('preview', timer, audio_data.shape[-1] / sample_rate)
+    return out_path
+
+def preview_start_range(audio_in, large_file_in, preview_start_sec):
+    #let the excerpt start slider cover the whole uploaded clip - only the file header is read
+    in_path = large_file_in if large_file_in is not None else audio_in
+    if in_path is None:
+        return gr.skip()
+    with AudioFile(in_path) as f:
+        duration_sec = f.duration
+    return gr.update(maximum = max(duration_sec, 1), value = min(preview_start_sec, duration_sec))
+
+def auto_preview(auto_preview_enabled, audio_in, large_file_in, preview_start_sec, preview_duration_sec, *preset_values):
+    if not auto_preview_enabled or (audio_in is None and large_file_in is None):
+        return gr.skip()
+    return process_preview(audio_in, large_file_in, preview_start_sec, preview_duration_sec, *preset_values)
+
+def process_live_chunk(chunk, live_processor, *preset_values):
+    #called for every microphone chunk while recording. live_processor is kept in gr.State between calls
+    if chunk is None:
+        return gr.skip(), gr.skip(), live_processor
+
+    preset = dict(zip(PRESET_KEYS, preset_values))
+    if live_processor is None or not live_processor.matches(preset):
+        live_processor = LiveProcessor(preset) #effect settings changed - start a fresh board
+
+    sample_rate, audio_data = chunk
+    timer = RequestTimer()
+    with timed(timer, 'effects (live)'):
+        out_audio = live_processor.process(to_float32(audio_data), sample_rate)
+    metrics.observe('live', timer, audio_data.shape[0] / sample_rate)
+
+    stats = live_processor.stats(sample_rate)
+    stats_text = (f"Block {stats['block_ms']:.0f} ms processed in {stats['process_ms']:.1f} ms "
+        f"(max {stats['max_process_ms']:.1f} ms) - {100 * stats['realtime_load']:.1f}% of realtime budget"
+        f"{'' if stats['realtime_load'] < 1 else ' - TOO SLOW FOR REALTIME'}  \n"
+        f"Estimated end-to-end latency {stats['latency_ms']:.0f} ms "
+        f"(block {stats['block_ms']:.0f} + buffering up to {stats['buffer_ms']:.0f} + processing {stats['process_ms']:.1f} "
+        f"+ plugin {stats['plugin_latency_ms']:.0f})")
+    if stats['bypassed']:
+        stats_text += (f"  \n**Bypassed: {', '.join(stats['bypassed'])}** - these effects only work on the whole clip, "
+            'so they can\'t run live and are left out of the numbers above')
+
+    if out_audio.shape[-1] == 0: #plugins with latency return nothing until they have buffered enough
+        return gr.skip(), stats_text, live_processor
+    return (sample_rate, to_int16(out_audio)), stats_text, live_processor
 
-def process_audio(audio_in, gain,
-    noise_gate_enabled, noise_gate_threshold_db, noise_gate_ratio, noise_gate_attack_ms, noise_gate_release_ms,
-    reverb_enabled, reverb_room_size, reverb_damping, reverb_wet_level, reverb_dry_level, reverb_width, reverb_freeze_mode,
-    delay_enabled, delay_sec, delay_feedback, delay_mix,
-    chorus_enabled, chorus_rate_hz, chorus_depth, chorus_center_delay, chorus_feedback, chorus_mix,
-    phaser_enabled, phaser_rate_hz, phaser_depth, phaser_center_frequency, phaser_feedback, phaser_mix,
-    pitchshift_enabled, pitchshift_semitones,
-    compressor_enabled, compressor_threshold_db, compressor_ratio, compressor_attack_ms, compressor_release_ms,
-
-    distortion_enabled, distortion_drive_db,
-    bitcrush_enabled, bitcrush_bit_depth,
-    gsm_full_rate_compressor,
-    mp3_compressor_enabled, mp3_compressor_vbr_quality,
-    resample_method, resample_target_sample_rate,
-
-    highpass_filter_enabled, highpass_filter_cutoff_frequency,
-    lowpass_filter_enabled, lowpass_filter_cutoff_frequency,
-    high_shelf_filter_enabled, high_shelf_filter_cutoff_hz, high_shelf_filter_gain_db, high_shelf_filter_q,
-    low_shelf_filter_enabled, low_shelf_filter_cutoff_hz, low_shelf_filter_gain_db, low_shelf_filter_q,
-    peak_filter_enabled, peak_filter_cutoff_hz, peak_filter_gain_db, peak_filter_q,
-    ladder_filter_enabled, ladder_filter_mode, ladder_filter_cutoff_hz, ladder_filter_resonance, ladder_filter_drive,
-    limiter_enabled, limiter_threshold_db, limiter_release_ms,
-    clipping_enabled, clipping_threshold,
-
-    padding_start_sec, padding_end_sec,
-    time_strech_factor, time_strech_pitch_shift_semitones,
-    ):
-    board = Pedalboard()
-
-    if noise_gate_enabled:
-        board.append(NoiseGate(noise_gate_threshold_db, noise_gate_ratio, noise_gate_attack_ms, noise_gate_release_ms))
-
-    if gain != 0:
-        board.append(Gain(gain_db = gain))
-
-    if reverb_enabled:
-        board.append(Reverb(reverb_room_size, reverb_damping, reverb_wet_level, reverb_dry_level, reverb_width, reverb_freeze_mode))
-
-    if delay_enabled:
-        board.append(Delay(delay_sec, delay_feedback, delay_mix))
-
-    if chorus_enabled:
-        board.append(Chorus(chorus_rate_hz, chorus_depth, chorus_center_delay, chorus_feedback, chorus_mix))
-
-    if phaser_enabled:
-        board.append(Phaser(phaser_rate_hz, phaser_depth, phaser_center_frequency, phaser_feedback, phaser_mix))
-
-    if pitchshift_enabled:
-        board.append(PitchShift(pitchshift_semitones))
-
-    if compressor_enabled:
-        board.append(Compressor(compressor_threshold_db, compressor_ratio, compressor_attack_ms, compressor_release_ms))
-
-    if distortion_enabled:
-        board.append(Distortion(distortion_drive_db))
-
-    if bitcrush_enabled:
-        board.append(Bitcrush(bitcrush_bit_depth))
-
-    if gsm_full_rate_compressor != 'None':
-        board.append(GSMFullRateCompressor(quality = getattr(Resample.Quality, gsm_full_rate_compressor)))
-
-    if mp3_compressor_enabled:
-        board.append(MP3Compressor(mp3_compressor_vbr_quality))
-
-    if resample_method != 'None':
-        board.append(Resample(resample_target_sample_rate, getattr(Resample.Quality, resample_method)))
-
-    if highpass_filter_enabled:
-        board.append(HighpassFilter(highpass_filter_cutoff_frequency))
-
-    if lowpass_filter_enabled:
-        board.append(LowpassFilter(lowpass_filter_cutoff_frequency))
-
-    if high_shelf_filter_enabled:
-        board.append(HighShelfFilter(high_shelf_filter_cutoff_hz, high_shelf_filter_gain_db, high_shelf_filter_q))
-
-    if low_shelf_filter_enabled:
-        board.append(LowShelfFilter(low_shelf_filter_cutoff_hz, low_shelf_filter_gain_db, low_shelf_filter_q))
-
-    if peak_filter_enabled:
-        board.append(PeakFilter(peak_filter_cutoff_hz, peak_filter_gain_db, peak_filter_q))
-
-    if ladder_filter_enabled:
-        board.append(LadderFilter(getattr(LadderFilter.Mode,ladder_filter_mode),
-            ladder_filter_cutoff_hz, ladder_filter_resonance, ladder_filter_drive))
-
-    if limiter_enabled:
-        board.append(Limiter(limiter_threshold_db, limiter_release_ms))
-
-    if clipping_enabled:
-        board.append(Clipping(clipping_threshold))
-
-    print(board)
-
-    sample_rate, audio_data = audio_in
-
-    #Gradio loads audio as int16 - pedalboard needs audio in float32
-    #convertion per https://stackoverflow.com/questions/42544661/convert-numpy-int16-audio-array-to-float32/42544738#42544738
-    audio_data = np.ascontiguousarray(audio_data.T.astype(np.float32, order='C') / 32768.0)
-
-    if padding_start_sec > 0 or padding_end_sec > 0:
-        num_channels = audio_data.shape[0]
-
-        vals = []
-        if padding_start_sec > 0:
-            if num_channels == 2:
-                vals.append(np.zeros((num_channels, int(sample_rate * padding_start_sec))))
-            else:
-                vals.append(np.zeros((int(sample_rate * padding_start_sec),) ))
-        vals.append(audio_data)
-        if padding_end_sec > 0:
-            if num_channels == 2:
-                vals.append(np.zeros((num_channels, int(sample_rate * padding_end_sec))))
-            else:
-                vals.append(np.zeros((int(sample_rate * padding_end_sec),)))
-
-        audio_data = np.hstack(vals)
-
-    out_audio = board(audio_data, sample_rate)
-
-    if time_strech_factor != 1:
-        # a few more args for this function per: https://spotify.github.io/pedalboard/reference/pedalboard.html#pedalboard.time_stretch
-        out_audio = time_stretch(out_audio, sample_rate, time_strech_factor, pitchshift_semitones)
-
-    out_audio = (out_audio.T * 32768.0).astype(np.int16) #convert back from float32 to int16 for Gradio frontend
-    return (sample_rate, out_audio)
-    
-    '''#do this for very large audio files, where memory is a constraint
-    with AudioFile(audio_in) as f:
-        sample_rate = f.samplerate
-        num_channels = f.num_channels
-        data = f.read(f.frames)
-        out_audio = board(data, sample_rate)
-
-    with AudioFile(AUDIO_OUT_PATH, 'w', sample_rate, num_channels) as out:
-        out.write(out_audio)
-
-    return None
-    '''
 
 with gr.Blocks() as demo:
 
     with gr.Row():
         audio_in = gr.Audio(
             sources = ['upload','microphone'], #can also include 'microphone' if streaming = True
-            type = 'numpy', #can be 'numpy' or 'filepath'
+            type = 'filepath', #decoded with pedalboard.io.AudioFile at full resolution rather than Gradio's int16 numpy
             label = 'Input Audio',
             interactive = True,
             editable = True,
             )
 
+    with gr.Row():
+        with gr.Accordion(label = 'Live Microphone Mode', open = False):
+            gr.Markdown('Streams microphone audio through the effect chain as you record. Effect state (reverb / delay tails) '
+                'carries over between chunks. Padding and Time Stretch are not applied in this mode.')
+            with gr.Row():
+                live_in = gr.Audio(sources = ['microphone'], type = 'numpy', streaming = True, label = 'Live Input')
+                live_out = gr.Audio(label = 'Live Output', streaming = True, autoplay = True, interactive = False)
+            live_stats = gr.Markdown()
+            live_processor = gr.State()
+
+    with gr.Row():
+        with gr.Accordion(label = 'Large File Mode', open = False):
+            gr.Markdown('For long files (podcasts, DJ sets...) - the file is read, processed and written in blocks, so memory usage '
+                'stays constant regardless of clip length. When a file is uploaded here it is used instead of Input Audio. '
+                'Pitch Shift, GSM Full Rate Compressor and Time Stretch are not available in this mode.')
+            large_file_in = gr.File(label = 'Large Input Audio File', file_types = ['audio'], type = 'filepath')
+            stream_block_size = gr.Slider(label = 'Block Size (samples)', value = 65536, minimum = 1024, maximum = 1048576, step = 1024)
+
+    with gr.Row():
+        output_format = gr.Dropdown(label = 'Output Format',
+            choices = [('WAV', '.wav'), ('FLAC', '.flac'), ('OGG Vorbis', '.ogg'), ('MP3', '.mp3')], value = '.flac')
+        output_quality = gr.Dropdown(label = 'Output Quality - FLAC compression level / OGG bitrate / MP3 VBR level or bitrate',
+            choices = OUTPUT_QUALITIES['.flac'][0], value = OUTPUT_QUALITIES['.flac'][1])
+        output_bit_depth = gr.Dropdown(label = 'Output Bit Depth (WAV / FLAC)',
+            choices = [('16-bit', 16), ('24-bit', 24), ('32-bit float', 32)], value = 16)
+        with gr.Column():
+            parallel_render = gr.Checkbox(label = 'Parallel Render - split long clips into segments processed across CPU cores. '
+                'Chorus, Phaser, Pitch Shift, GSM, MP3, Resample and Time Stretch still run on the whole clip')
+            segment_sec = gr.Slider(label = 'Segment Length Seconds', value = 30, minimum = 5, maximum = 300)
+
+    with gr.Row():
+        with gr.Accordion(label = 'Presets', open = False):
+            gr.Markdown('Save every effect setting to a JSON preset file, or upload one saved earlier to restore it. '
+                'Preset files can also be used with `pedalboard_batch.py`.')
+            with gr.Row():
+                save_preset_button = gr.Button('Save Preset')
+                preset_file = gr.File(label = 'Preset File', file_types = ['.json'], type = 'filepath')
+
     with gr.Row():
         with gr.Column():
             gain = gr.Slider(label = 'Gain db', value = 0, minimum = -30, maximum = 30)
@@ -165,7 +366,7 @@ with gr.Blocks() as demo:
                 gr.Markdown('A simple noise gate with standard threshold, ratio, attack time and release time controls. Can be used as an expander if the ratio is low')
                 noise_gate_enabled = gr.Checkbox(label = 'Noise Gate Enabled')
                 noise_gate_threshold_db = gr.Slider(label = 'Threshold db', value = -100, minimum = -200, maximum = 0)
-                noise_gate_ratio = gr.Slider(label = 'Ratio', value = 0, minimum = 10, maximum = 20)
+                noise_gate_ratio = gr.Slider(label = 'Ratio', value = 10, minimum = 10, maximum = 20)
                 noise_gate_attack_ms = gr.Slider(label = 'Attack ms', value = 1, minimum = 0, maximum = 10)
                 noise_gate_release_ms = gr.Slider(label = 'Release ms', value = 100, minimum = 0, maximum = 300)
 
@@ -241,7 +442,6 @@ with gr.Blocks() as demo:
                     choices = ['None', 'ZeroOrderHold', 'Linear', 'CatmullRom', 'Lagrange', 'WindowedSinc', 
                         'WindowedSinc256', 'WindowedSinc128', 'WindowedSinc64', 'WindowedSinc32', 'WindowedSinc16',
                          'WindowedSinc8'],
-                        'WindowedSinc8'],
                     value = 'None')
                 resample_target_sample_rate = gr.Slider(label = 'Target Sample Rate Hz', value = 8000, minimum = 0, maximum = 44100)
 
@@ -305,40 +505,123 @@ with gr.Blocks() as demo:
                 clipping_threshold = gr.Slider(label = 'Clipping Threshold db', value = -6, minimum = -30, maximum = 20)
 
     with gr.Row():
-        submit_button = gr.Button('Submit')
+        with gr.Accordion(label = 'Preview', open = False):
+            gr.Markdown('Quickly render a short excerpt of the input through the effect chain. '
+                'Submit renders the preview first, then the full clip replaces it when done.')
+            with gr.Row():
+                #maximum follows the uploaded clip's duration, see preview_start_range
+                preview_start_sec = gr.Slider(label = 'Excerpt Start Seconds', value = 0, minimum = 0, maximum = MAX_CLIP_SEC)
+                preview_duration_sec = gr.Slider(label = 'Excerpt Length Seconds', value = 5, minimum = 1, maximum = 30)
+                auto_preview_enabled = gr.Checkbox(label = 'Auto Preview When Controls Change')
+
+    with gr.Row():
+        with gr.Accordion(label = 'Parameter Sweep', open = False):
+            gr.Markdown('Render the input with many variants of the current settings in one job - one parameter per line, '
+                'either a list of values or an evenly spaced range `start:stop:count`. Every combination is rendered, '
+                'and variants that start with the same effect settings share that part of the processing. '
+                'Parameter names are the ones in `pedalboard_engine.DEFAULT_PRESET`. Remember to enable the effects you sweep.')
+            sweep_text = gr.Textbox(label = 'Sweep', lines = 3,
+                placeholder = 'reverb_room_size = 0.1:1:10\ndistortion_drive_db = 10, 20, 30')
+            sweep_button = gr.Button('Render Sweep')
+            sweep_summary = gr.Markdown()
+            with gr.Row():
+                sweep_zip = gr.File(label = 'All Variants (zip)')
+                sweep_files = gr.File(label = 'Variants', file_count = 'multiple')
+            sweep_stats = gr.Dataframe(label = 'Per-Variant Render Time', headers = SWEEP_STATS_HEADERS, interactive = False)
 
     with gr.Row():
-        audio_out = gr.Audio(label = 'Output Audio', interactive = False, show_download_button = True, loop = True)
-
-    submit_button.click(fn = process_audio, 
-        inputs = [audio_in,
-            gain,
-            noise_gate_enabled, noise_gate_threshold_db, noise_gate_ratio, noise_gate_attack_ms, noise_gate_release_ms,
-            reverb_enabled, reverb_room_size, reverb_damping, reverb_wet_level, reverb_dry_level, reverb_width, reverb_freeze_mode,
-            delay_enabled, delay_sec, delay_feedback, delay_mix,
-            chorus_enabled, chorus_rate_hz, chorus_depth, chorus_center_delay, chorus_feedback, chorus_mix,
-            phaser_enabled, phaser_rate_hz, phaser_depth, phaser_center_frequency, phaser_feedback, phaser_mix,
-            pitchshift_enabled, pitchshift_semitones,
-            compressor_enabled, compressor_threshold_db, compressor_ratio, compressor_attack_ms, compressor_release_ms,
-
-            distortion_enabled, distortion_drive_db,
-            bitcrush_enabled, bitcrush_bit_depth,
-            gsm_full_rate_compressor,
-            mp3_compressor_enabled, mp3_compressor_vbr_quality,
-            resample_method, resample_target_sample_rate,
-
-            highpass_filter_enabled, highpass_filter_cutoff_frequency,
-            lowpass_filter_enabled, lowpass_filter_cutoff_frequency,
-            high_shelf_filter_enabled, high_shelf_filter_cutoff_hz, high_shelf_filter_gain_db, high_shelf_filter_q,
-            low_shelf_filter_enabled, low_shelf_filter_cutoff_hz, low_shelf_filter_gain_db, low_shelf_filter_q,
-            peak_filter_enabled, peak_filter_cutoff_hz, peak_filter_gain_db, peak_filter_q,      
-            ladder_filter_enabled, ladder_filter_mode, ladder_filter_cutoff_hz, ladder_filter_resonance, ladder_filter_drive,
-            limiter_enabled, limiter_threshold_db, limiter_release_ms,
-            clipping_enabled, clipping_threshold,
-
-            padding_start_sec, padding_end_sec,
-            time_strech_factor, time_strech_pitch_shift_semitones,
-            ],
-        outputs = [audio_out])
-
-demo.launch(inbrowser = True, server_port = 7680)
+        preview_button = gr.Button('Preview')
+        submit_button = gr.Button('Submit', variant = 'primary')
+
+    with gr.Row():
+        preview_out = gr.Audio(label = 'Preview Audio', interactive = False, autoplay = True)
+
+    with gr.Row():
+        with gr.Column():
+            audio_out = gr.Audio(label = 'Output Audio', interactive = False, show_download_button = True, loop = True)
+            output_waveform = gr.Image(label = 'Output Waveform', interactive = False, show_download_button = False,
+                height = 120)
+        with gr.Column():
+            render_stats = gr.Dataframe(label = 'Render Time Breakdown', headers = RENDER_STATS_HEADERS, interactive = False)
+            render_info_out = gr.Markdown()
+
+    #effect controls in the same order as pedalboard_engine.PRESET_KEYS
+    preset_inputs = [gain,
+        noise_gate_enabled, noise_gate_threshold_db, noise_gate_ratio, noise_gate_attack_ms, noise_gate_release_ms,
+        reverb_enabled, reverb_room_size, reverb_damping, reverb_wet_level, reverb_dry_level, reverb_width, reverb_freeze_mode,
+        delay_enabled, delay_sec, delay_feedback, delay_mix,
+        chorus_enabled, chorus_rate_hz, chorus_depth, chorus_center_delay, chorus_feedback, chorus_mix,
+        phaser_enabled, phaser_rate_hz, phaser_depth, phaser_center_frequency, phaser_feedback, phaser_mix,
+        pitchshift_enabled, pitchshift_semitones,
+        compressor_enabled, compressor_threshold_db, compressor_ratio, compressor_attack_ms, compressor_release_ms,
+
+        distortion_enabled, distortion_drive_db,
+        bitcrush_enabled, bitcrush_bit_depth,
+        gsm_full_rate_compressor,
+        mp3_compressor_enabled, mp3_compressor_vbr_quality,
+        resample_method, resample_target_sample_rate,
+
+        highpass_filter_enabled, highpass_filter_cutoff_frequency,
+        lowpass_filter_enabled, lowpass_filter_cutoff_frequency,
+        high_shelf_filter_enabled, high_shelf_filter_cutoff_hz, high_shelf_filter_gain_db, high_shelf_filter_q,
+        low_shelf_filter_enabled, low_shelf_filter_cutoff_hz, low_shelf_filter_gain_db, low_shelf_filter_q,
+        peak_filter_enabled, peak_filter_cutoff_hz, peak_filter_gain_db, peak_filter_q,
+        ladder_filter_enabled, ladder_filter_mode, ladder_filter_cutoff_hz, ladder_filter_resonance, ladder_filter_drive,
+        limiter_enabled, limiter_threshold_db, limiter_release_ms,
+        clipping_enabled, clipping_threshold,
+
+        padding_start_sec, padding_end_sec,
+        time_strech_factor, time_strech_pitch_shift_semitones,
+        ]
+
+    preview_inputs = [audio_in, large_file_in, preview_start_sec, preview_duration_sec] + preset_inputs
+
+    gr.on(triggers = [audio_in.change, large_file_in.change], fn = preview_start_range,
+        inputs = [audio_in, large_file_in, preview_start_sec], outputs = [preview_start_sec], show_progress = 'hidden')
+
+    #previews and full renders have separate concurrency limits, so previews don't wait behind long renders
+    preview_button.click(fn = process_preview, inputs = preview_inputs, outputs = [preview_out],
+        concurrency_id = 'preview', concurrency_limit = RENDER_WORKERS)
+
+    #submit starts the preview and the full render as independent jobs - the preview usually comes back first, and
+    #the full render doesn't wait for it or depend on it succeeding (e.g. a heavy chain going over the preview budget)
+    submit_button.click(fn = process_preview, inputs = preview_inputs, outputs = [preview_out],
+        concurrency_id = 'preview', concurrency_limit = RENDER_WORKERS)
+    submit_button.click(fn = process_audio,
+        inputs = [audio_in, large_file_in, stream_block_size, output_format, output_quality, output_bit_depth,
+            parallel_render, segment_sec] + preset_inputs,
+        outputs = [audio_out, output_waveform, render_stats, render_info_out],
+        concurrency_id = 'render', concurrency_limit = RENDER_WORKERS)
+
+    output_format.change(fn = output_quality_choices, inputs = [output_format], outputs = [output_quality])
+
+    save_preset_button.click(fn = save_preset_file, inputs = preset_inputs, outputs = [preset_file])
+    preset_file.upload(fn = load_preset_file, inputs = [preset_file], outputs = preset_inputs)
+
+    sweep_button.click(fn = process_sweep,
+        inputs = [audio_in, sweep_text, output_format, output_quality, output_bit_depth] + preset_inputs,
+        outputs = [sweep_zip, sweep_files, sweep_stats, sweep_summary],
+        concurrency_id = 'render', concurrency_limit = RENDER_WORKERS)
+
+    live_in.start_recording(fn = lambda: None, outputs = [live_processor]) #fresh plugin state for each recording
+    live_in.stream(fn = process_live_chunk,
+        inputs = [live_in, live_processor] + preset_inputs,
+        outputs = [live_out, live_stats, live_processor],
+        stream_every = 0.1,
+        concurrency_limit = None,
+        show_progress = 'hidden')
+
+    #auto preview - sliders trigger on release rather than on every drag step, and always_last drops
+    #intermediate changes that arrive while a preview is still rendering (debouncing)
+    gr.on(triggers = [c.release if isinstance(c, gr.Slider) else c.change for c in preset_inputs],
+        fn = auto_preview,
+        inputs = [auto_preview_enabled] + preview_inputs,
+        outputs = [preview_out],
+        trigger_mode = 'always_last',
+        show_progress = 'minimal',
+        concurrency_id = 'preview', concurrency_limit = RENDER_WORKERS)
+
+if __name__ == '__main__':
+    metrics.serve(METRICS_PORT)
+    demo.queue(max_size = MAX_QUEUE_SIZE)
+    demo.launch(inbrowser = True, server_port = 7680)
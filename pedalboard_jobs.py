@@ -0,0 +1,48 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+from pedalboard_metrics import RenderTimeout
+
+#fixed-size pool of render workers with a per-job time budget
+
+class RenderPool:
+    #executor = 'thread' suits most chains since pedalboard releases the GIL while plugins process audio, so
+    #renders run in parallel and share the in-memory caches. 'process' runs each render in a worker process instead,
+    #for chains that hold the GIL - each process then has its own caches
+
+    def __init__(self, workers = None, executor = 'thread'):
+        if executor not in ('thread', 'process'):
+            raise ValueError(f"executor must be 'thread' or 'process', not {executor!r}")
+
+        self.workers = workers or os.cpu_count()
+        self.executor = executor
+        pool_class = ThreadPoolExecutor if executor == 'thread' else ProcessPoolExecutor
+        self._pool = pool_class(max_workers = self.workers)
+        #one slot per worker, held until the job really finishes. A job that timed out keeps running until its next
+        #stage / block (a single whole-clip stage can't be interrupted), so new jobs wait here for a free worker -
+        #with their budget counting - instead of piling up in the executor's unbounded queue behind it
+        self._slots = threading.BoundedSemaphore(self.workers)
+
+    def run(self, fn, *args, budget_sec = None):
+        #run fn(*args) on a worker and wait for the result. If it takes longer than budget_sec, including time spent
+        #waiting for a free worker, RenderTimeout is raised straight away - the job itself stops at its next stage /
+        #block (see RequestTimer), and only then frees its worker
+        deadline = time.monotonic() + budget_sec if budget_sec else None
+        if not self._slots.acquire(timeout = budget_sec or None):
+            raise RenderTimeout(f'No render worker became free within the time budget of {budget_sec:g} seconds')
+
+        try:
+            future = self._pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout = max(deadline - time.monotonic(), 0) if deadline else None)
+        except TimeoutError:
+            raise RenderTimeout(f'Render went over its time budget of {budget_sec:g} seconds') from None
+
+    def shutdown(self):
+        self._pool.shutdown(wait = False, cancel_futures = True)
@@ -0,0 +1,141 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+#per-request stage timings, plus server-wide counters and latency histograms exported in Prometheus text format
+#from a small local HTTP endpoint, and optionally appended to a JSON lines log file
+
+LATENCY_BUCKETS_SEC = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+class RenderTimeout(Exception):
+    pass
+
+class RequestTimer:
+    #wall time per stage for one render. Timing the same stage name more than once adds up (e.g. per streamed block)
+    #With budget_sec, starting a stage after the budget has run out raises RenderTimeout - stages and streamed blocks
+    #are the cancellation points for a render that runs too long
+
+    def __init__(self, budget_sec = None):
+        self.stages = {}
+        self.start = time.perf_counter()
+        self.budget_sec = budget_sec
+        self.deadline = time.time() + budget_sec if budget_sec else None #wall clock, so it survives pickling to a worker
+
+    def check_budget(self):
+        if self.deadline is not None and time.time() > self.deadline:
+            raise RenderTimeout(f'Render went over its time budget of {self.budget_sec:g} seconds')
+
+    @contextmanager
+    def time(self, stage):
+        self.check_budget()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def total_sec(self):
+        return time.perf_counter() - self.start
+
+    def breakdown(self, audio_sec, sample_rate):
+        #table rows of [stage, ms, % of total, samples/sec, realtime factor] followed by a total row
+        total_sec = self.total_sec()
+        num_samples = audio_sec * sample_rate
+        rows = []
+        for stage, seconds in list(self.stages.items()) + [('total', total_sec)]:
+            rows.append([stage, round(1000 * seconds, 1), round(100 * seconds / max(total_sec, 1e-9), 1),
+                round(num_samples / seconds) if seconds > 0 else None,
+                round(audio_sec / seconds, 1) if seconds > 0 else None])
+        return rows
+
+class Histogram:
+
+    def __init__(self, buckets = LATENCY_BUCKETS_SEC):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+class Metrics:
+    #aggregate counters and histograms across all requests - thread safe, requests are handled concurrently
+
+    def __init__(self, log_path = None):
+        self.log_path = log_path
+        self.counters = {}
+        self.request_latency = {}
+        self.stage_latency = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, kind, timer, audio_sec, error = None, **extra):
+        #record one finished request. kind is e.g. 'render' or 'preview'. After a timeout the job may still be running
+        #and adding stages, so work from a snapshot - dict() copies in one step under the GIL
+        total_sec = timer.total_sec()
+        stages = dict(timer.stages)
+        with self._lock:
+            for name, value in [(f'{kind}_requests_total', 1), (f'{kind}_errors_total', 1 if error else 0),
+                    (f'{kind}_audio_seconds_total', audio_sec), (f'{kind}_wall_seconds_total', total_sec)]:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+            self.request_latency.setdefault(kind, Histogram()).observe(total_sec)
+            for stage, seconds in stages.items():
+                self.stage_latency.setdefault(stage, Histogram()).observe(seconds)
+
+        if self.log_path:
+            record = {'time': time.time(), 'kind': kind, 'audio_sec': audio_sec, 'total_sec': total_sec,
+                'stages': stages, 'error': error and str(error), **extra}
+            with self._lock, open(self.log_path, 'a') as f:
+                f.write(json.dumps(record, default = str) + '\n')
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'pedalboard_{name} {value}')
+            for metric, label, histograms in [('request_seconds', 'kind', self.request_latency),
+                    ('stage_seconds', 'stage', self.stage_latency)]:
+                for key, h in sorted(histograms.items()):
+                    for bound, count in zip(h.buckets, h.counts):
+                        lines.append(f'pedalboard_{metric}_bucket{{{label}="{key}",le="{bound}"}} {count}')
+                    lines.append(f'pedalboard_{metric}_bucket{{{label}="{key}",le="+Inf"}} {h.count}')
+                    lines.append(f'pedalboard_{metric}_sum{{{label}="{key}"}} {h.sum}')
+                    lines.append(f'pedalboard_{metric}_count{{{label}="{key}"}} {h.count}')
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port, host = '127.0.0.1'):
+        #serve GET /metrics on a background thread
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target = server.serve_forever, daemon = True).start()
+        return server
@@ -0,0 +1,152 @@
+import itertools
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import numpy as np
+from pedalboard_engine import DEFAULT_PRESET, build_stages, load_preset, pad_audio, time_stretch_stage
+
+#parameter sweeps - render one clip with many preset variants in a single job. The input is decoded once, and
+#variants whose chains start with the same stages share those stages' output instead of recomputing them
+
+MAX_SWEEP_VARIANTS = 64
+
+def parse_value(text, default):
+    #parse one sweep value to the same type as the parameter's default
+    text = text.strip()
+    if isinstance(default, bool):
+        if text.lower() not in ('true', 'false', '1', '0', 'yes', 'no', 'on', 'off'):
+            raise ValueError(f'Expected true / false, got {text!r}')
+        return text.lower() in ('true', '1', 'yes', 'on')
+    if isinstance(default, str):
+        return text
+    return float(text)
+
+def parse_sweep(text):
+    #one parameter per line (or separated by ;), either a list or an evenly spaced range (start:stop:count)
+    #  reverb_room_size = 0.1:1:10
+    #  distortion_drive_db = 10, 20, 30
+    sweep = {}
+    for line in text.replace(';', '\n').splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        name, equals, values = line.partition('=')
+        name = name.strip()
+        if not equals or name not in DEFAULT_PRESET:
+            raise ValueError(f'Expected "<parameter> = <values>" with a parameter from DEFAULT_PRESET, got {line!r}')
+
+        default = DEFAULT_PRESET[name]
+        try:
+            if ':' in values:
+                if isinstance(default, (bool, str)):
+                    raise ValueError('ranges only work for numeric parameters, list the values instead')
+                bounds = values.split(':')
+                if len(bounds) != 3 or int(bounds[2]) < 1:
+                    raise ValueError('expected a range as start:stop:count, with count at least 1')
+                start, stop, count = float(bounds[0]), float(bounds[1]), int(bounds[2])
+                sweep[name] = [round(float(v), 6) for v in np.linspace(start, stop, count)]
+            else:
+                sweep[name] = [parse_value(v, default) for v in values.split(',')]
+        except ValueError as e:
+            raise ValueError(f'{name}: {e}') from None
+
+    return sweep
+
+def expand_sweep(preset, sweep):
+    #every combination of the swept values on top of preset - returns [(overrides, full preset), ...]
+    names = list(sweep)
+    combinations = list(itertools.product(*(sweep[name] for name in names)))
+    if len(combinations) > MAX_SWEEP_VARIANTS:
+        raise ValueError(f'Sweep has {len(combinations)} variants - the limit is {MAX_SWEEP_VARIANTS}')
+
+    base = load_preset(preset)
+    variants = []
+    for values in combinations:
+        overrides = dict(zip(names, values))
+        variant = {**base, **overrides}
+        try:
+            build_stages(variant) #catch values the plugins reject (e.g. an unknown resample method) before rendering
+        except Exception as e:
+            swept = ', '.join(f'{name} = {value}' for name, value in overrides.items())
+            raise ValueError(f'Invalid sweep values ({swept}): {e}') from None
+        variants.append((overrides, variant))
+    return variants
+
+def variant_name(index, overrides):
+    parts = [f'{name}-{value:g}' if isinstance(value, float) else f'{name}-{value}' for name, value in overrides.items()]
+    return '_'.join([f'{index + 1:03d}'] + parts)
+
+def sweep_chain(preset):
+    #full chain for one variant as (stage_key, fn) - padding and time stretch included, so they can be shared too
+    p = load_preset(preset)
+    start_sec, end_sec = p['padding_start_sec'], p['padding_end_sec']
+
+    def pad(audio_data, sample_rate):
+        return pad_audio(audio_data, sample_rate, start_sec, end_sec)
+
+    chain = [(('padding', start_sec, end_sec), pad)]
+    chain += build_stages(p)
+    stretch = time_stretch_stage(p)
+    if stretch:
+        chain.append(stretch)
+    return chain
+
+def render_sweep(audio_data, sample_rate, presets, on_output, workers = None, timer = None):
+    #render unpadded audio with every preset. Chains are merged into a prefix tree so stages shared between variants
+    #run once, and independent branches run in parallel. on_output(variant index, audio) is called on the worker as
+    #soon as a variant is finished (e.g. to encode it), and the audio is dropped afterwards - only the intermediate
+    #outputs that unfinished branches still need are kept in memory. Returns per-variant stats in presets order
+    root = {'children': {}, 'variants': [], 'users': 0}
+    paths = []
+    for v, preset in enumerate(presets):
+        node, path = root, []
+        for stage_key, fn in sweep_chain(preset):
+            node = node['children'].setdefault(stage_key,
+                {'children': {}, 'variants': [], 'users': 0, 'name': stage_key[0], 'fn': fn, 'sec': 0.0})
+            node['users'] += 1
+            path.append(node)
+        node['variants'].append(v)
+        paths.append(path)
+
+    def run(node, audio):
+        if timer is not None:
+            timer.check_budget() #cancellation point between stages, like render_stages
+        start = time.perf_counter()
+        out_audio = node['fn'](audio, sample_rate)
+        node['sec'] = time.perf_counter() - start
+        for v in node['variants']:
+            on_output(v, out_audio)
+        return out_audio if node['children'] else None
+
+    for v in root['variants']:
+        on_output(v, audio_data)
+
+    with ThreadPoolExecutor(max_workers = workers or os.cpu_count()) as pool:
+        def submit_children(node, audio):
+            return {pool.submit(run, child, audio): child for child in node['children'].values()}
+
+        pending = submit_children(root, audio_data)
+        while pending:
+            done, _ = wait(pending, return_when = FIRST_COMPLETED)
+            for future in done:
+                node = pending.pop(future)
+                pending.update(submit_children(node, future.result()))
+
+    if timer is not None:
+        nodes = [root]
+        while nodes:
+            node = nodes.pop()
+            nodes += node['children'].values()
+            if node is not root:
+                timer.add(node['name'], node['sec'])
+
+    stats = []
+    for path in paths:
+        stats.append({
+            'stages': len(path),
+            'shared_stages': sum(1 for node in path if node['users'] > 1),
+            'standalone_sec': sum(node['sec'] for node in path), #what this variant would cost rendered on its own
+            'render_sec': sum(node['sec'] / node['users'] for node in path), #shared stages split between their users
+        })
+    return stats
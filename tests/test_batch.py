@@ -0,0 +1,16 @@
+import os
+import numpy as np
+from pedalboard_batch import run_batch
+from pedalboard_engine import write_audio
+
+def test_batch_never_overwrites_its_input(tmp_path):
+    in_path = write_audio(str(tmp_path / 'clip.wav'), np.zeros((2, 4410), dtype = np.float32), 44100)
+    size = os.path.getsize(in_path)
+
+    failures, _, _ = run_batch({'gain': 6}, str(tmp_path), str(tmp_path), workers = 1, output_extension = 'wav')
+    assert failures == 1
+    assert os.path.getsize(in_path) == size
+
+    failures, _, _ = run_batch({'gain': 6}, str(tmp_path), str(tmp_path / 'out'), workers = 1, output_extension = 'flac')
+    assert failures == 0
+    assert os.path.exists(tmp_path / 'out' / 'clip.flac') #extension without the leading dot is accepted
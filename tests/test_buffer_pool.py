@@ -0,0 +1,25 @@
+import numpy as np
+from pedalboard_engine import BufferPool
+
+def test_buffer_pool_reuses_and_bounds_bytes():
+    pool = BufferPool(max_bytes = 3 * 4000)
+    a = pool.acquire((2, 500)) #4000 bytes
+    pool.release(a)
+    b = pool.acquire((2, 400)) #fits in the released buffer
+    assert np.shares_memory(a, b) and b.shape == (2, 400)
+    pool.release(b)
+
+    buffers = [pool.acquire((2, 500)) for _ in range(4)]
+    for buf in buffers:
+        pool.release(buf)
+    assert pool.num_bytes <= pool.max_bytes
+
+    pool.release(pool.acquire((2, 5000))) #bigger than the whole pool - not kept
+    assert pool.num_bytes <= pool.max_bytes
+    assert all(buf.nbytes <= pool.max_bytes for buf in pool._free)
+
+def test_buffer_pool_ignores_arrays_it_did_not_issue():
+    pool = BufferPool(max_bytes = 2 ** 20)
+    pool.release(np.zeros((2, 33408), dtype = np.float32)) #e.g. read_audio's fallback for inexact MP3 lengths
+    assert pool.num_bytes == 0
+    assert pool.acquire((2, 1000)).shape == (2, 1000)
@@ -0,0 +1,32 @@
+import time
+import pytest
+from pedalboard_jobs import RenderPool
+from pedalboard_metrics import RenderTimeout
+
+def sleep(sec, started = None):
+    if started is not None:
+        started.append(sec)
+    time.sleep(sec)
+    return sec
+
+def test_timed_out_job_keeps_its_worker():
+    pool = RenderPool(1)
+    try:
+        start = time.monotonic()
+        with pytest.raises(RenderTimeout):
+            pool.run(sleep, 2, budget_sec = 0.5)
+        assert time.monotonic() - start < 1
+
+        #the first job is still running - the next one must not queue up behind it past its own budget
+        started = []
+        start = time.monotonic()
+        with pytest.raises(RenderTimeout):
+            pool.run(sleep, 0.1, started, budget_sec = 0.5)
+        assert time.monotonic() - start < 1
+        assert started == []
+
+        time.sleep(1.2) #first job finishes and frees the worker
+        assert pool.run(sleep, 0.1, budget_sec = 0.5) == 0.1
+        assert pool.run(sleep, 0.1) == 0.1 #no budget - waits for as long as it takes
+    finally:
+        pool.shutdown()
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from pedalboard.io import AudioFile
+from pedalboard_engine import OUTPUT_QUALITIES, WaveformThumbnail, write_audio
+
+SAMPLE_RATE = 44100
+
+def test_thumbnail_blockwise_matches_whole():
+    rng = np.random.default_rng(0)
+    audio = rng.uniform(-1, 1, (2, 100003)).astype(np.float32)
+    whole = WaveformThumbnail(audio.shape[-1], width = 300)
+    whole.add(audio)
+    blockwise = WaveformThumbnail(audio.shape[-1], width = 300)
+    for start in range(0, audio.shape[-1], 4099):
+        blockwise.add(audio[:, start:start + 4099])
+
+    assert len(whole.highs) <= 300
+    assert whole.highs == blockwise.highs and whole.lows == blockwise.lows
+    assert whole.image(height = 50).shape == (50, len(whole.highs), 3)
+
+@pytest.mark.parametrize('extension', list(OUTPUT_QUALITIES))
+def test_write_audio_formats(tmp_path, extension):
+    t = np.arange(SAMPLE_RATE * 2) / SAMPLE_RATE
+    audio = np.stack([0.5 * np.sin(2 * np.pi * 440 * t)] * 2).astype(np.float32)
+    path = write_audio(str(tmp_path / f'out{extension}'), audio, SAMPLE_RATE, 32, OUTPUT_QUALITIES[extension][1],
+        block_size = 10000)
+
+    with AudioFile(path) as f:
+        assert f.num_channels == 2
+        assert abs(f.duration - 2) < 0.1 #lossy encoders may add a little padding
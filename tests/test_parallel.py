@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from pedalboard_engine import render_audio, render_parallel
+from pedalboard_metrics import RequestTimer
+
+SAMPLE_RATE = 44100
+
+def make_audio(num_channels, length_sec = 20, seed = 0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(SAMPLE_RATE * length_sec)) / SAMPLE_RATE
+    tone = 0.3 * np.sin(2 * np.pi * 220 * t) * (1 + np.sin(2 * np.pi * 0.5 * t)) #swells, so dynamics stages work
+    audio = np.stack([tone + 0.05 * rng.standard_normal(t.shape[0]) for _ in range(num_channels)])
+    return audio.astype(np.float32)
+
+@pytest.mark.parametrize('preset', [
+    {'highpass_filter_enabled': True, 'compressor_enabled': True, 'compressor_threshold_db': -20, 'compressor_ratio': 4,
+        'limiter_enabled': True},
+    {'noise_gate_enabled': True, 'noise_gate_threshold_db': -30, 'peak_filter_enabled': True, 'peak_filter_gain_db': 6,
+        'ladder_filter_enabled': True, 'ladder_filter_resonance': 0.5},
+    {'reverb_enabled': True, 'reverb_room_size': 0.8, 'lowpass_filter_enabled': True,
+        'lowpass_filter_cutoff_frequency': 2000},
+    {'delay_enabled': True, 'delay_sec': 0.3, 'delay_feedback': 0.5, 'gain': 6, 'clipping_enabled': True},
+    #chorus can't be segmented - runs serially between the parallel runs
+    {'compressor_enabled': True, 'compressor_threshold_db': -20, 'chorus_enabled': True, 'reverb_enabled': True},
+    #time stretch always runs serially after the board
+    {'highpass_filter_enabled': True, 'compressor_enabled': True, 'compressor_threshold_db': -20,
+        'time_strech_factor': 1.5},
+])
+@pytest.mark.parametrize('num_channels', [1, 2])
+def test_parallel_matches_serial(preset, num_channels):
+    audio = make_audio(num_channels)
+    serial = render_audio(audio, SAMPLE_RATE, preset)
+    parallel = render_parallel(audio, SAMPLE_RATE, preset, workers = 4, segment_sec = 3)
+
+    assert parallel.shape == serial.shape
+    assert np.abs(parallel - serial).max() < 1e-2
+    #error at least 40dB below the signal
+    assert np.sqrt(np.mean((parallel - serial) ** 2)) < 1e-2 * np.sqrt(np.mean(serial ** 2))
+
+def test_parallel_mono_1d():
+    audio = make_audio(1)[0]
+    preset = {'reverb_enabled': True, 'highpass_filter_enabled': True}
+    parallel = render_parallel(audio, SAMPLE_RATE, preset, segment_sec = 3)
+
+    assert parallel.shape == audio.shape
+    assert np.abs(parallel - render_audio(audio, SAMPLE_RATE, preset)).max() < 1e-2
+
+def test_short_clip_falls_back_to_serial():
+    audio = make_audio(2, length_sec = 1)
+    preset = {'reverb_enabled': True, 'compressor_enabled': True}
+    np.testing.assert_array_equal(render_parallel(audio, SAMPLE_RATE, preset, segment_sec = 3),
+        render_audio(audio, SAMPLE_RATE, preset))
+
+def test_long_warmup_runs_serially():
+    #a 3s delay with 0.95 feedback needs minutes of warm-up - far more than the segment, so it isn't segmented
+    audio = make_audio(2)
+    preset = {'highpass_filter_enabled': True, 'delay_enabled': True, 'delay_sec': 3, 'delay_feedback': 0.95}
+    timer = RequestTimer()
+    parallel = render_parallel(audio, SAMPLE_RATE, preset, workers = 4, segment_sec = 3, timer = timer)
+
+    assert 'delay' in timer.stages and 'highpass_filter (parallel)' in timer.stages
+    assert np.abs(parallel - render_audio(audio, SAMPLE_RATE, preset)).max() < 1e-2
@@ -0,0 +1,50 @@
+import os
+import pedalboard
+import pedalboard_cache
+from pedalboard_cache import RenderCache, render_key
+from pedalboard_engine import dump_preset
+
+def write_file(path, num_bytes):
+    with open(path, 'wb') as f:
+        f.write(os.urandom(num_bytes))
+    return path
+
+def test_dump_preset_is_stable():
+    assert dump_preset({'gain': 5, 'reverb_enabled': True}) == dump_preset({'reverb_enabled': True, 'gain': 5.0})
+    assert dump_preset({'gain': 5}) != dump_preset({'gain': 6})
+    assert render_key('abc', dump_preset({})) != render_key('abd', dump_preset({}))
+
+def test_render_key_includes_versions(monkeypatch):
+    key = render_key('abc', dump_preset({}))
+    monkeypatch.setattr(pedalboard_cache, 'RENDER_CACHE_VERSION', pedalboard_cache.RENDER_CACHE_VERSION + 1)
+    assert render_key('abc', dump_preset({})) != key
+    monkeypatch.undo()
+    monkeypatch.setattr(pedalboard, '__version__', pedalboard.__version__ + '.post1')
+    assert render_key('abc', dump_preset({})) != key
+
+def test_render_cache_lru(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'), max_bytes = 2500)
+    for key in 'abc':
+        cache.put(key, write_file(str(tmp_path / f'{key}.wav'), 1000))
+    assert cache.get('a', lambda: str(tmp_path / 'out.wav')) is None #evicted, over the size limit
+    assert len(cache) == 2 and cache.num_bytes == 2000
+
+    assert cache.get('b', lambda: str(tmp_path / 'out.wav')) == str(tmp_path / 'out.wav') #b is now most recently used
+    cache.put('d', write_file(str(tmp_path / 'd.wav'), 1000))
+    assert cache.get('c', lambda: str(tmp_path / 'out.wav')) is None
+    assert cache.get('b', lambda: str(tmp_path / 'out.wav')) is not None
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    #index is rebuilt from the cache directory on restart
+    assert len(RenderCache(str(tmp_path / 'cache'), max_bytes = 2500)) == 2
+
+def test_render_cache_miss_creates_no_output(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'), max_bytes = 2500)
+    made = []
+    assert cache.get('a', lambda: made.append(1)) is None
+    assert not made
+
+    cache.put('b', write_file(str(tmp_path / 'b.wav'), 1000))
+    os.remove(os.path.join(str(tmp_path / 'cache'), 'b.wav')) #deleted from outside
+    assert cache.get('b', lambda: write_file(str(tmp_path / 'out.wav'), 0)) is None
+    assert not os.path.exists(str(tmp_path / 'out.wav')) and len(cache) == 0
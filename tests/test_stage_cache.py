@@ -0,0 +1,60 @@
+import numpy as np
+from pedalboard_cache import StageCache
+from pedalboard_engine import render_audio
+from pedalboard_metrics import RequestTimer
+
+SAMPLE_RATE = 44100
+
+def make_audio(length_sec = 2, seed = 0):
+    rng = np.random.default_rng(seed)
+    return (0.2 * rng.standard_normal((2, SAMPLE_RATE * length_sec))).astype(np.float32)
+
+def test_resumed_render_matches_uncached():
+    audio = make_audio()
+    preset = {'highpass_filter_enabled': True, 'reverb_enabled': True, 'limiter_enabled': True}
+    tweaked = {**preset, 'limiter_threshold_db': -20} #only the last stage changes
+    cache = StageCache(256 * 2 ** 20)
+
+    render_audio(audio, SAMPLE_RATE, preset, cache = cache)
+    timer = RequestTimer()
+    resumed = render_audio(audio, SAMPLE_RATE, tweaked, cache = cache, timer = timer)
+
+    assert [stage for stage in timer.stages if stage != 'cache lookup'] == ['limiter'] #resumed after the reverb
+    np.testing.assert_array_equal(resumed, render_audio(audio, SAMPLE_RATE, tweaked))
+
+    #the final output isn't cached, so repeating a render only re-runs the last stage
+    timer = RequestTimer()
+    np.testing.assert_array_equal(render_audio(audio, SAMPLE_RATE, tweaked, cache = cache, timer = timer), resumed)
+    assert list(timer.stages) == ['cache lookup', 'limiter']
+
+def test_long_clip_keeps_prefix_for_last_stage():
+    #cache smaller than two clip-sized buffers - tweaking the last stage should still resume after the one before it
+    audio = make_audio()
+    preset = {'reverb_enabled': True, 'highpass_filter_enabled': True, 'limiter_enabled': True}
+    tweaked = {**preset, 'limiter_threshold_db': -20}
+    cache = StageCache(int(1.6 * audio.nbytes))
+
+    render_audio(audio, SAMPLE_RATE, preset, cache = cache)
+    timer = RequestTimer()
+    resumed = render_audio(audio, SAMPLE_RATE, tweaked, cache = cache, timer = timer)
+
+    assert [stage for stage in timer.stages if stage != 'cache lookup'] == ['limiter']
+    np.testing.assert_array_equal(resumed, render_audio(audio, SAMPLE_RATE, tweaked))
+    assert cache.num_bytes <= cache.max_bytes
+
+def test_stage_cache_evicts_lru_by_bytes():
+    buffers = [make_audio(1, seed) for seed in range(4)]
+    cache = StageCache(int(2.5 * buffers[0].nbytes))
+    cache.put('a', buffers[0])
+    cache.put('b', buffers[1])
+    cache.get('a') #a is now more recently used than b
+    cache.put('c', buffers[2])
+
+    assert cache.num_bytes <= cache.max_bytes
+    assert cache.get('b') is None
+    assert cache.get('a') is buffers[0] and cache.get('c') is buffers[2]
+    assert not buffers[0].flags.writeable #cached buffers are shared, so they are made read-only
+
+    cache.put('big', np.zeros(cache.max_bytes // 4 + 1, dtype = np.float32)) #larger than the whole cache
+    assert cache.get('big') is None and len(cache) == 2
+    assert cache.num_bytes == buffers[0].nbytes + buffers[2].nbytes
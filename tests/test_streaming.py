@@ -0,0 +1,74 @@
+import itertools
+import numpy as np
+import pytest
+from pedalboard_engine import (LiveProcessor, build_board, process_file, read_audio, render_audio, stream_audio_file,
+    unstreamable_effects, write_audio)
+
+SAMPLE_RATE = 44100
+BLOCK_SIZES = [4096, 8192, 65536]
+
+#plugins with latency - streaming has to flush what they hold back so the output lines up with the in-memory render
+STREAMABLE = {
+    'mp3_compressor': {'mp3_compressor_enabled': True},
+    'resample': {'resample_method': 'WindowedSinc32'},
+    'reverb': {'reverb_enabled': True, 'delay_enabled': True, 'delay_feedback': 0.5},
+}
+UNSTREAMABLE = {
+    'pitchshift': {'pitchshift_enabled': True, 'pitchshift_semitones': 3},
+    'gsm_full_rate_compressor': {'gsm_full_rate_compressor': 'WindowedSinc8'},
+}
+
+@pytest.fixture(scope = 'module')
+def in_path(tmp_path_factory):
+    t = np.arange(SAMPLE_RATE * 5) / SAMPLE_RATE
+    tone = 0.3 * np.sin(2 * np.pi * 440 * t) * (1 + 0.5 * np.sin(2 * np.pi * 0.7 * t))
+    return write_audio(str(tmp_path_factory.mktemp('audio') / 'in.wav'), np.stack([tone] * 2), SAMPLE_RATE, 32)
+
+@pytest.mark.parametrize('block_size', BLOCK_SIZES)
+@pytest.mark.parametrize('effect', list(STREAMABLE))
+def test_streamed_matches_in_memory(tmp_path, in_path, effect, block_size):
+    preset = {**STREAMABLE[effect], 'padding_start_sec': 0.1, 'padding_end_sec': 0.5}
+    assert unstreamable_effects(preset) == []
+    expected = render_audio(read_audio(in_path, 0.1, 0.5)[0], SAMPLE_RATE, preset)
+
+    out_path = stream_audio_file(build_board(preset), in_path, str(tmp_path / 'out.wav'), block_size, 0.1, 0.5, 32)
+    streamed = read_audio(out_path)[0]
+
+    assert streamed.shape == expected.shape
+    np.testing.assert_allclose(streamed, expected, atol = 1e-5)
+
+@pytest.mark.parametrize('effect', list(UNSTREAMABLE))
+def test_unstreamable_is_rejected(tmp_path, in_path, effect):
+    preset = UNSTREAMABLE[effect]
+    assert unstreamable_effects(preset) == [effect]
+    with pytest.raises(ValueError):
+        stream_audio_file(build_board(preset), in_path, str(tmp_path / 'out.wav'), BLOCK_SIZES[0])
+
+@pytest.mark.parametrize('effect', list(UNSTREAMABLE))
+def test_process_file_renders_unstreamable_in_memory(tmp_path, in_path, effect):
+    preset = {**UNSTREAMABLE[effect], 'padding_end_sec': 0.5}
+    expected = render_audio(read_audio(in_path, 0, 0.5)[0], SAMPLE_RATE, preset)
+
+    out_path = str(tmp_path / 'out.wav')
+    process_file(in_path, out_path, preset, block_size = BLOCK_SIZES[0], bit_depth = 32)
+
+    np.testing.assert_allclose(read_audio(out_path)[0], expected, atol = 1e-5)
+
+@pytest.mark.parametrize('effect', list(STREAMABLE) + list(UNSTREAMABLE))
+def test_live_matches_in_memory(in_path, effect):
+    audio = read_audio(in_path)[0]
+    processor = LiveProcessor(UNSTREAMABLE.get(effect, STREAMABLE.get(effect)))
+    bypassed = effect in UNSTREAMABLE
+    expected = audio if bypassed else render_audio(audio, SAMPLE_RATE, STREAMABLE[effect])
+
+    out_blocks, start = [], 0
+    for size in itertools.cycle([4800, 3000, 9600, 4801, 1]): #microphone chunks vary in size
+        if start >= audio.shape[-1]:
+            break
+        out_blocks.append(processor.process(audio[:, start:start + size], SAMPLE_RATE))
+        start += size
+    live = np.concatenate(out_blocks, axis = 1)
+
+    assert live.shape[-1] > audio.shape[-1] - 10000 #only latency + a partial block are held back
+    np.testing.assert_allclose(live, expected[:, :live.shape[-1]], atol = 1e-5)
+    assert processor.stats(SAMPLE_RATE)['bypassed'] == ([effect] if bypassed else [])
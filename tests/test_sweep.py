@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from pedalboard_engine import load_preset, process_array
+from pedalboard_sweep import MAX_SWEEP_VARIANTS, expand_sweep, parse_sweep, render_sweep
+
+SAMPLE_RATE = 44100
+
+def test_parse_sweep():
+    sweep = parse_sweep('reverb_room_size = 0:1:3\ndistortion_enabled = true, false; resample_method = Linear, ZeroOrderHold')
+    assert sweep == {'reverb_room_size': [0.0, 0.5, 1.0], 'distortion_enabled': [True, False],
+        'resample_method': ['Linear', 'ZeroOrderHold']}
+
+    with pytest.raises(ValueError):
+        parse_sweep('not_a_parameter = 1, 2')
+
+@pytest.mark.parametrize('text', ['resample_method = 0:1:2', 'distortion_enabled = 0:1:2', 'gain = 1:2',
+    'gain = 1:2:0', 'gain = 1, loud'])
+def test_parse_sweep_rejects_bad_values(text):
+    with pytest.raises(ValueError, match = text.split(' ')[0]):
+        parse_sweep(text)
+
+def test_expand_sweep_rejects_values_plugins_refuse():
+    with pytest.raises(ValueError, match = 'resample_method = Bogus'):
+        expand_sweep({}, parse_sweep('resample_method = Linear, Bogus'))
+
+def test_expand_sweep_limit():
+    assert len(expand_sweep({}, {'gain': [1, 2], 'reverb_room_size': [0.1, 0.2, 0.3]})) == 6
+    with pytest.raises(ValueError):
+        expand_sweep({}, {'gain': list(range(MAX_SWEEP_VARIANTS + 1))})
+
+def test_sweep_matches_single_renders():
+    rng = np.random.default_rng(0)
+    audio = (0.2 * rng.standard_normal((2, SAMPLE_RATE * 2))).astype(np.float32)
+    base = {'highpass_filter_enabled': True, 'reverb_enabled': True, 'limiter_enabled': True, 'padding_end_sec': 0.5}
+    variants = expand_sweep(base, parse_sweep('reverb_room_size = 0.2, 0.8\nlimiter_threshold_db = -6, -12'))
+
+    outputs = {}
+    stats = render_sweep(audio, SAMPLE_RATE, [preset for _, preset in variants], outputs.__setitem__, workers = 2)
+
+    assert sorted(outputs) == list(range(len(variants)))
+    for v, ((_, preset), s) in enumerate(zip(variants, stats)):
+        np.testing.assert_allclose(outputs[v], process_array(audio, SAMPLE_RATE, load_preset(preset)), atol = 1e-6)
+        assert s['shared_stages'] >= 2 #padding and highpass are common to every variant